@@ -1,70 +1,104 @@
 import os
-import logging
-
-from flask import Flask, request, jsonify
-from logging.handlers import RotatingFileHandler
-from logging.config import dictConfig
-
-from transformers import AutoTokenizer, TFAutoModelForSequenceClassification
-from transformers import pipeline
-
-
-dictConfig(
-    {
-        "version": 1,
-        "formatters": {
-            "default": {
-                "format": "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]",
-            }
-        },
-        "handlers": {
-            "wsgi": {
-                "class": "logging.StreamHandler",
-                "stream": "ext://sys.stdout",
-                "formatter": "default",
-            }
-        },
-        "root": {
-            "level": "INFO",
-            "handlers": ["wsgi"],
-        },
-    }
-)
+import math
+import random
+import statistics
+import threading
+import time
 
-app = Flask(__name__)
+from collections import Counter
 
-# Configure logging
-if not os.path.exists("logs"):
-    os.mkdir("logs")
-file_handler = RotatingFileHandler(
-    "logs/bias-detection.log", maxBytes=10240, backupCount=10
-)
-file_handler.setFormatter(
-    logging.Formatter(
-        "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
-    )
-)
-file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
+import numpy as np
+
+from flask import Flask, Response, request, jsonify
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from transformers import AutoConfig, AutoTokenizer
+
+import backends
+import memory
+import structured_logging
+from batcher import MicroBatcher
+from chunk_cache import ChunkCache
+
+
+structured_logging.setup("bias-detection")
+
+app = Flask(__name__)
 app.logger.info("Bias Detection startup")
 
-# Load SpaCy and add spacytextblob to the pipeline
-# Initialize the text classification pipeline
-tokenizer = AutoTokenizer.from_pretrained("d4data/bias-detection-model")
-model = TFAutoModelForSequenceClassification.from_pretrained(
-    "d4data/bias-detection-model"
+# tokens per chunk including the special tokens, 0 uses the model maximum (512)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))
+# tokens shared by consecutive chunks
+CHUNK_STRIDE = int(os.getenv("CHUNK_STRIDE", "0"))
+# chunks classified together in one padded forward pass
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+# milliseconds a batch waits for chunks of concurrent requests before it starts
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "5"))
+# sequence lengths the chunks of a batch are padded to, a few fixed input shapes
+# keep the compiled TF graph from handling every chunk length anew
+SEQUENCE_BUCKETS = os.getenv("SEQUENCE_BUCKETS", "64,128,256,512")
+# tf, onnx or onnx-int8, see backends.py
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "tf")
+# chunk classifications cached in memory per worker, 0 disables the cache
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "10000"))
+# SQLite database the workers share chunk classifications in, disabled if empty
+CHUNK_CACHE_PATH = os.getenv("CHUNK_CACHE_PATH", "")
+# chunk classifications kept in the SQLite database, the oldest are deleted first
+CHUNK_CACHE_DISK_SIZE = int(os.getenv("CHUNK_CACHE_DISK_SIZE", "1000000"))
+# defaults of the early-exit mode, see settled
+EARLY_EXIT_CONFIDENCE = float(os.getenv("EARLY_EXIT_CONFIDENCE", "0.95"))
+EARLY_EXIT_MARGIN = float(os.getenv("EARLY_EXIT_MARGIN", "0.1"))
+# exact classifies every chunk, early-exit stops once the result is settled
+MODES = ("exact", "early-exit")
+# the score of the predicted label of two labels is in [0.5, 1.0]
+MAX_SCORE_VARIANCE = 0.25**2
+
+# Load the tokenizer and model config, chunks are batched by classify_chunks
+tokenizer = AutoTokenizer.from_pretrained(backends.MODEL_NAME, use_fast=True)
+config = AutoConfig.from_pretrained(backends.MODEL_NAME)
+max_tokens = min(tokenizer.model_max_length, config.max_position_embeddings)
+if CHUNK_TOKENS:
+    max_tokens = min(CHUNK_TOKENS, max_tokens)
+# tokens of the text per chunk, the rest is taken by [CLS] and [SEP]
+window = max_tokens - tokenizer.num_special_tokens_to_add()
+if not 0 <= CHUNK_STRIDE < window:
+    raise ValueError(f"CHUNK_STRIDE must be in [0, {window})")
+buckets = sorted(
+    {min(int(length), max_tokens) for length in SEQUENCE_BUCKETS.split(",")}
+    | {max_tokens}
 )
-classifier = pipeline(
-    "text-classification", model=model, tokenizer=tokenizer
-)  # cuda = 0,1 based on gpu availability
+
+# The model is loaded before gunicorn forks the workers if the backend allows it, so
+# the workers share its weights, otherwise every worker loads it on first use
+backend = None
+backend_lock = threading.Lock()
+# set once the worker has finished its warm-up inference
+ready = threading.Event()
+
+
+def get_backend():
+    """
+    The inference backend, loaded on first use
+    """
+    global backend
+    with backend_lock:
+        if backend is None:
+            backend = backends.load(INFERENCE_BACKEND)
+            app.logger.info(f"inference backend: {INFERENCE_BACKEND}")
+    return backend
+
+
+if backends.fork_safe(INFERENCE_BACKEND):
+    get_backend()
 app.logger.info("model setup complete")
 
 def combine_classifications(classifications):
     """
     Combine the results of multiple classifications within one text corpus into a single result
     """
-    app.logger.info(f"combine classifications: {classifications}")
+    app.logger.debug(
+        "combine classifications: %s", classifications, extra={"payload": True}
+    )
 
     bias_score = 0
     non_bias_score = 0
@@ -80,7 +114,7 @@ def combine_classifications(classifications):
     bias_score = bias_score / biased_chunks if biased_chunks > 0 else 0
     non_bias_score = non_bias_score / non_biased_chunks if non_biased_chunks > 0 else 0
 
-    app.logger.info(f"bias_score: {bias_score} non_bias_score: {non_bias_score}")
+    app.logger.debug("bias_score: %s non_bias_score: %s", bias_score, non_bias_score)
 
     if bias_score > non_bias_score:
         # text is mostly biased
@@ -95,6 +129,268 @@ def combine_classifications(classifications):
         "score": non_bias_score - bias_score
     }
 
+def chunk_text(text):
+    """
+    Tokenize a text once and split the token ids into windows of the maximum model
+    input length, overlapping by CHUNK_STRIDE tokens
+    """
+    ids = tokenizer(text, add_special_tokens=False, verbose=False)["input_ids"]
+    chunks = []
+    for i in range(0, len(ids), window - CHUNK_STRIDE):
+        chunks.append(tokenizer.build_inputs_with_special_tokens(ids[i : i + window]))
+        if i + window >= len(ids):
+            break
+    return chunks
+
+
+def bucket(size, sizes):
+    """
+    The smallest of the ascending sizes that fits size
+    """
+    return next(s for s in sizes if s >= size)
+
+
+def batch_buckets():
+    """
+    Batch sizes of backends with static shapes: powers of two up to BATCH_SIZE
+    """
+    return sorted(
+        {min(2**i, BATCH_SIZE) for i in range(BATCH_SIZE.bit_length() + 1)}
+    )
+
+
+def pad_batch(chunks):
+    """
+    Pad a batch of token id chunks to the next sequence length bucket. For backends
+    that compile every input shape the batch is filled up to the next batch size
+    bucket with copies of its first chunk, whose results are to be dropped.
+    """
+    length = bucket(max(len(chunk) for chunk in chunks), buckets)
+    if get_backend().static_shapes:
+        size = bucket(len(chunks), batch_buckets())
+        chunks = chunks + [chunks[0]] * (size - len(chunks))
+    # the chunks are token ids already, they only need padding
+    return tokenizer.pad(
+        {"input_ids": chunks},
+        padding="max_length",
+        max_length=length,
+        return_tensors="np",
+    )
+
+
+def classify_chunks(chunks):
+    """
+    Classify chunks of token ids in padded batches of BATCH_SIZE chunks, with the
+    same output as the text-classification pipeline (which runs list inputs one by
+    one with TF)
+    """
+    classifications = []
+    for i in range(0, len(chunks), BATCH_SIZE):
+        batch = chunks[i : i + BATCH_SIZE]
+        inputs = pad_batch(batch)
+        logits = get_backend().logits(inputs["input_ids"], inputs["attention_mask"])
+        logits = logits[: len(batch)]
+        scores = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        scores /= scores.sum(axis=-1, keepdims=True)
+        for chunk_scores in scores:
+            label = int(chunk_scores.argmax())
+            classifications.append(
+                {
+                    "label": config.id2label[label],
+                    "score": float(chunk_scores[label]),
+                }
+            )
+    return classifications
+
+
+# chunks of concurrent requests share forward passes
+batcher = MicroBatcher(classify_chunks, BATCH_SIZE, BATCH_WAIT_MS / 1000)
+# chunks shared by texts, e.g. of syndicated articles or disclaimers, are classified
+# once, the results differ per backend
+cache = ChunkCache(
+    CHUNK_CACHE_SIZE,
+    CHUNK_CACHE_PATH or None,
+    namespace=f"{backends.MODEL_NAME}:{INFERENCE_BACKEND}",
+    max_disk_size=CHUNK_CACHE_DISK_SIZE,
+)
+
+
+def classify_texts(texts):
+    """
+    Classify the chunks of all texts that are not cached in padded batches of
+    BATCH_SIZE chunks and combine the chunk results per text
+    """
+    chunks = [chunk_text(text) for text in texts]
+    keys = [[cache.key(chunk) for chunk in text_chunks] for text_chunks in chunks]
+    all_keys = [key for text_keys in keys for key in text_keys]
+    classified = cache.get(list(dict.fromkeys(all_keys)))
+
+    # every distinct chunk is classified once
+    missing = {}
+    for text_keys, text_chunks in zip(keys, chunks):
+        for key, chunk in zip(text_keys, text_chunks):
+            if key not in classified:
+                missing[key] = chunk
+    if missing:
+        new = dict(zip(missing, batcher.submit(list(missing.values()))))
+        cache.put(new)
+        classified.update(new)
+    app.logger.info("classified %d of %d chunks", len(missing), len(all_keys))
+
+    return [
+        combine_classifications([classified[key] for key in text_keys])
+        for text_keys in keys
+    ]
+
+
+def classify(text):
+    """
+    Classify a text chunk by chunk and combine the chunk results
+    """
+    return classify_texts([text])[0]
+
+
+def settled(classifications, total, confidence, margin):
+    """
+    Whether the classifications of a random sample of the total chunks of a text
+    settle the gap between the average biased and non-biased score of all chunks:
+    its confidence interval is at most margin wide on either side and does not
+    contain 0. A label without any sampled chunk counts as absent once a label with
+    a share of margin of the chunks would have been sampled with the confidence.
+    """
+    n = len(classifications)
+    if n >= total:
+        return True
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    biased = [c["score"] for c in classifications if c["label"] == "Biased"]
+    non_biased = [c["score"] for c in classifications if c["label"] != "Biased"]
+    variance = 0
+    for scores in (biased, non_biased):
+        if not scores:
+            if n < math.log(1 - confidence) / math.log(1 - margin):
+                return False
+        elif len(scores) == 1:
+            variance += MAX_SCORE_VARIANCE
+        else:
+            variance += statistics.variance(scores) / len(scores)
+    # the chunks are sampled without replacement
+    half_width = z * math.sqrt(variance * (total - n) / (total - 1))
+    gap = (statistics.mean(biased) if biased else 0) - (
+        statistics.mean(non_biased) if non_biased else 0
+    )
+    return half_width <= margin and abs(gap) > half_width
+
+
+def classify_early_exit(text, confidence, margin):
+    """
+    Classify the chunks of a text batch by batch in a random order until the result
+    is settled, cached chunks are used first, and combine the classified chunks
+    """
+    chunks = chunk_text(text)
+    if not chunks:
+        # e.g. a text of whitespace only
+        result = combine_classifications([])
+        result["chunks"] = {"evaluated": 0, "skipped": 0}
+        return result
+    keys = [cache.key(chunk) for chunk in chunks]
+    chunks_by_key = dict(zip(keys, chunks))
+    counts = Counter(keys)
+    known = cache.get(list(counts))
+    classifications = [known[key] for key in keys if key in known]
+    cached = len(classifications)
+
+    # seeded by the text (str seeds are hashed with SHA-512, not hash()), so the
+    # result of a text is reproducible across workers and restarts
+    pending = [key for key in counts if key not in known]
+    random.Random(text).shuffle(pending)
+    classified = 0
+    while pending and not settled(classifications, len(keys), confidence, margin):
+        batch, pending = pending[:BATCH_SIZE], pending[BATCH_SIZE:]
+        new = dict(zip(batch, batcher.submit([chunks_by_key[key] for key in batch])))
+        cache.put(new)
+        classified += len(batch)
+        for key in batch:
+            classifications += [new[key]] * counts[key]
+
+    app.logger.info(
+        "early exit: evaluated %d of %d chunks, %d cached, %d distinct chunks classified",
+        len(classifications),
+        len(keys),
+        cached,
+        classified,
+    )
+    result = combine_classifications(classifications)
+    result["chunks"] = {
+        "evaluated": len(classifications),
+        "skipped": len(keys) - len(classifications),
+    }
+    return result
+
+
+def classification_mode(data):
+    """
+    The mode of a request with the confidence and margin of the early-exit mode,
+    raises ValueError for invalid values
+    """
+    mode = data.get("mode", "exact")
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    confidence = float(data.get("confidence", EARLY_EXIT_CONFIDENCE))
+    margin = float(data.get("margin", EARLY_EXIT_MARGIN))
+    if not (0 < confidence < 1 and 0 < margin < 1):
+        raise ValueError("confidence and margin must be in (0, 1)")
+    return mode, confidence, margin
+
+
+def warm_up_buckets():
+    """
+    Run a forward pass for every input shape, which traces and compiles the graph of
+    the TF backend, and log the latency of the first and of a second pass per shape
+    """
+    backend = get_backend()
+    for length in buckets:
+        chunk = tokenizer.build_inputs_with_special_tokens(
+            [tokenizer.unk_token_id] * (length - tokenizer.num_special_tokens_to_add())
+        )
+        for size in batch_buckets() if backend.static_shapes else [BATCH_SIZE]:
+            inputs = pad_batch([chunk] * size)
+            latencies = []
+            for _ in range(2):
+                start = time.perf_counter()
+                backend.logits(inputs["input_ids"], inputs["attention_mask"])
+                latencies.append(time.perf_counter() - start)
+            app.logger.info(
+                f"bucket {size}x{length}: first pass {latencies[0] * 1000:.0f} ms, "
+                f"then {latencies[1] * 1000:.1f} ms"
+            )
+
+
+def warm_up():
+    """
+    Load the backend, run every input shape once and classify a short text, then
+    mark the worker ready
+    """
+    start = time.perf_counter()
+    try:
+        warm_up_buckets()
+        classify("This is a warm-up inference.")
+    except Exception:
+        app.logger.error("Warm-up inference failed", exc_info=True)
+        return
+    ready.set()
+    app.logger.info(
+        f"worker {os.getpid()} ready after {time.perf_counter() - start:.1f}s, "
+        f"memory [MiB]: {memory.memory_usage()}"
+    )
+
+
+def start_warm_up():
+    """
+    Warm up in the background, so /health answers while the model loads
+    """
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
 @app.route("/analyze", methods=["POST"])
 def analyze_text():
     app.logger.info("Received request to analyze")
@@ -103,25 +399,87 @@ def analyze_text():
     if not text:
         app.logger.error("No text provided for analysis")
         return jsonify({"error": "No text provided"}), 400
+    try:
+        mode, confidence, margin = classification_mode(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
+    preview_text = structured_logging.preview(text)
     try:
-        # chunk text into 400 tokens
-        tokens = text.split()
-        classified_chunks = []
-        for i in range(0, len(tokens), 300):
-            chunk = " ".join(tokens[i : i + 300])
-            classified_chunks.append(classifier(chunk)[0])
-
-        result = combine_classifications(classified_chunks)
-
-        # Log only the first 30 characters of the text
-        preview_text = text[:30] + "..." if len(text) > 30 else text
-        app.logger.info(f"Analyzed text (preview): {preview_text}")
+        if mode == "early-exit":
+            result = classify_early_exit(text, confidence, margin)
+        else:
+            result = classify(text)
+        app.logger.info("Analyzed text (preview): %s", preview_text)
         return jsonify(result)
     except Exception as e:
-        app.logger.error(f"Error in processing text: {preview_text}", exc_info=True)
+        app.logger.error("Error in processing text: %s", preview_text, exc_info=True)
+        return jsonify({"error": "Error in processing request"}), 500
+
+
+@app.route("/analyze/batch", methods=["POST"])
+def analyze_batch():
+    """
+    Analyze several texts in one request, the results are in the order of the texts
+    """
+    data = request.json
+    texts = data.get("texts")
+    if not isinstance(texts, list):
+        app.logger.error("No texts provided for analysis")
+        return jsonify({"error": "No texts provided"}), 400
+    try:
+        mode, confidence, margin = classification_mode(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    app.logger.info("Received request to analyze %d texts", len(texts))
+
+    valid = [text for text in texts if text]
+    try:
+        if mode == "early-exit":
+            classified = iter(
+                [classify_early_exit(text, confidence, margin) for text in valid]
+            )
+        else:
+            classified = iter(classify_texts(valid))
+    except Exception:
+        app.logger.error("Error in processing texts", exc_info=True)
         return jsonify({"error": "Error in processing request"}), 500
 
+    results = [
+        next(classified) if text else {"error": "No text provided"} for text in texts
+    ]
+    return jsonify({"results": results})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Batcher queue depth, batch sizes, queue wait times and chunk cache lookups of
+    this worker
+    """
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Liveness of this worker with its memory usage, see memory.py
+    """
+    return jsonify(
+        {"status": "ok", "pid": os.getpid(), "memory": memory.memory_usage()}
+    )
+
+
+@app.route("/ready", methods=["GET"])
+def readiness():
+    """
+    200 once this worker has finished its warm-up inference, 503 before
+    """
+    if not ready.is_set():
+        return jsonify({"status": "warming up"}), 503
+    return jsonify({"status": "ready"})
+
 
 if __name__ == "__main__":
+    start_warm_up()
     app.run(debug=True, host="0.0.0.0")
@@ -0,0 +1,108 @@
+"""
+Inference backends of the bias model. All of them take padded numpy token ids and
+return the logits as numpy array, so the rest of the service does not depend on the
+backend.
+
+* tf: the TensorFlow model from the Hugging Face cache as tf.function, compiled with
+  XLA if TF_XLA is true
+* onnx: the model exported to ONNX by export-onnx.py, run with ONNX Runtime
+* onnx-int8: the same with dynamically quantized int8 weights
+"""
+
+import os
+
+import numpy as np
+
+from transformers import AutoConfig
+
+MODEL_NAME = "d4data/bias-detection-model"
+# directory the ONNX models are exported to at build time
+ONNX_DIR = os.getenv("ONNX_DIR", os.path.join(os.path.dirname(__file__), "onnx"))
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model-int8.onnx"}
+# compile the TensorFlow graph with XLA, every input shape is compiled separately
+TF_XLA = os.getenv("TF_XLA", "false") == "true"
+# ONNX Runtime threads per forward pass, 0 uses all cores. With a single thread
+# ONNX Runtime starts no thread pool and the session can be created before gunicorn
+# forks its workers, which scale across the cores instead.
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "1"))
+
+
+class TFBackend:
+    """
+    Runs the model as a tf.function, traced once for any batch size and sequence
+    length instead of eagerly op by op. With XLA the graph is compiled once per input
+    shape, so the inputs should only have a few distinct shapes (static_shapes).
+    """
+
+    def __init__(self, xla=TF_XLA):
+        import tensorflow as tf
+        from transformers import TFAutoModelForSequenceClassification
+
+        self.model = TFAutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+        self.config = self.model.config
+        self.static_shapes = xla
+        self.forward = tf.function(
+            self.__forward,
+            input_signature=[
+                tf.TensorSpec((None, None), tf.int32, name="input_ids"),
+                tf.TensorSpec((None, None), tf.int32, name="attention_mask"),
+            ],
+            jit_compile=xla,
+        )
+
+    def __forward(self, input_ids, attention_mask):
+        return self.model(
+            input_ids=input_ids, attention_mask=attention_mask, training=False
+        ).logits
+
+    def logits(self, input_ids, attention_mask):
+        return self.forward(
+            input_ids.astype(np.int32), attention_mask.astype(np.int32)
+        ).numpy()
+
+
+class ONNXBackend:
+    static_shapes = False
+
+    def __init__(self, path):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        options.intra_op_num_threads = ONNX_THREADS
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.config = AutoConfig.from_pretrained(MODEL_NAME)
+
+    def logits(self, input_ids, attention_mask):
+        return self.session.run(
+            None,
+            {
+                "input_ids": input_ids.astype(np.int32),
+                "attention_mask": attention_mask.astype(np.int32),
+            },
+        )[0]
+
+
+def fork_safe(name):
+    """
+    Whether the backend can be loaded before fork and used in the forked workers.
+    TensorFlow and multi-threaded ONNX Runtime sessions start thread pools that do
+    not exist in a forked child, their forward passes would block forever.
+    """
+    return name in ONNX_FILES and ONNX_THREADS == 1
+
+
+def load(name):
+    """
+    Load the backend with the given name
+    """
+    if name == "tf":
+        return TFBackend()
+    if name in ONNX_FILES:
+        return ONNXBackend(os.path.join(ONNX_DIR, ONNX_FILES[name]))
+    raise ValueError(f"Unknown inference backend {name}")
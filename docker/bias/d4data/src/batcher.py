@@ -0,0 +1,86 @@
+"""
+Micro-batching of classification requests across concurrent requests
+"""
+
+import os
+import queue
+import threading
+import time
+
+from concurrent.futures import Future
+
+from prometheus_client import Gauge, Histogram
+
+QUEUE_DEPTH = Gauge("d4data_batcher_queue_depth", "Chunks waiting to be classified")
+BATCH_SIZE = Histogram(
+    "d4data_batcher_batch_size",
+    "Chunks per forward pass",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+WAIT_SECONDS = Histogram(
+    "d4data_batcher_wait_seconds",
+    "Time a chunk waited in the queue before its batch started",
+    buckets=(0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+class MicroBatcher:
+    """
+    Collects the items of concurrent submit calls into batches of at most
+    max_batch_size items and passes every batch to fn in a single call.
+
+    A batch is started as soon as it is full or max_wait seconds after its first
+    item arrived. The worker thread is started on first use in every process, so the
+    batcher can be created before gunicorn forks its workers.
+    """
+
+    def __init__(self, fn, max_batch_size, max_wait):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pid = None
+        QUEUE_DEPTH.set_function(self.queue.qsize)
+
+    def submit(self, items):
+        """
+        Classify the items and block until all results are available
+        """
+        self.start()
+        futures = []
+        for item in items:
+            future = Future()
+            self.queue.put((item, future, time.perf_counter()))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def start(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = batch[0][2] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(
+                        self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                    )
+                except queue.Empty:
+                    break
+
+            started = time.perf_counter()
+            BATCH_SIZE.observe(len(batch))
+            for _, _, enqueued in batch:
+                WAIT_SECONDS.observe(started - enqueued)
+            try:
+                results = self.fn([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
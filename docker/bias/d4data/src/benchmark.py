@@ -0,0 +1,64 @@
+"""
+Measure the classification throughput of the d4data service in chunks/s for
+different batch sizes and text lengths, e.g. to size CPU instances.
+
+Usage: python benchmark.py [--batch-sizes 1,4,8,16,32] [--words 300,1500,6000]
+       [--repeat 3]
+"""
+
+import argparse
+import time
+
+import app
+
+SAMPLE_TEXT = (
+    "The city council approved the new budget on Tuesday after a lengthy debate. "
+    "Supporters argued the plan invests in schools and public transport, while "
+    "critics warned that rising costs could force tax increases in the coming years. "
+)
+
+
+def sample_text(words):
+    sample = SAMPLE_TEXT.split()
+    return " ".join(sample[i % len(sample)] for i in range(words))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", default="1,4,8,16,32", help="comma separated")
+    parser.add_argument("--words", default="300,1500,6000", help="words per text")
+    parser.add_argument("--repeat", default=3, type=int, help="runs per measurement")
+    args = parser.parse_args()
+
+    batch_sizes = [int(value) for value in args.batch_sizes.split(",")]
+    lengths = [int(value) for value in args.words.split(",")]
+
+    # the first forward pass per input shape builds the TF graph, keep it out of
+    # the measurement
+    app.warm_up_buckets()
+
+    print(
+        f"{'words':>8} {'chunks':>7} {'batch size':>10} {'seconds':>8} {'chunks/s':>9}"
+    )
+    for words in lengths:
+        text = sample_text(words)
+        chunks = len(app.chunk_text(text))
+        for batch_size in batch_sizes:
+            app.BATCH_SIZE = batch_size
+            app.batcher.max_batch_size = batch_size
+            if app.get_backend().static_shapes:
+                # XLA compiles the batch size buckets of the new batch size
+                app.warm_up_buckets()
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                # past the chunk cache, which would answer the repeats
+                app.batcher.submit(app.chunk_text(text))
+            seconds = (time.perf_counter() - start) / args.repeat
+            print(
+                f"{words:>8} {chunks:>7} {batch_size:>10} {seconds:>8.3f} "
+                f"{chunks / seconds:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Cache of chunk classifications keyed by a hash of the token ids of the chunk
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+from collections import OrderedDict
+
+import numpy as np
+
+from prometheus_client import Counter
+
+LOOKUPS = Counter(
+    "d4data_chunk_cache_lookups",
+    "Chunk cache lookups by result: memory or disk hit, or miss",
+    ["result"],
+)
+# SQLite limits the number of parameters of a statement
+DISK_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkCache:
+    """
+    LRU cache of at most max_size chunk classifications ({label, score}) in memory,
+    optionally backed by an SQLite database at path, which all gunicorn workers
+    share and which keeps the max_disk_size most recently written classifications
+    (0 for no bound). The namespace is part of every key, so results of different
+    models or backends do not mix.
+    """
+
+    def __init__(self, max_size, path=None, namespace="", max_disk_size=0):
+        self.max_size = max_size
+        self.path = path
+        self.max_disk_size = max_disk_size
+        self.namespace = namespace.encode()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # one connection per thread, and per process after gunicorn forked
+        self.local = threading.local()
+        if path:
+            db = sqlite3.connect(path, timeout=5)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks "
+                "(key BLOB PRIMARY KEY, label TEXT, score REAL)"
+            )
+            db.commit()
+            db.close()
+
+    def key(self, chunk):
+        """
+        The cache key of a chunk of token ids
+        """
+        ids = np.asarray(chunk, dtype=np.int32).tobytes()
+        return hashlib.sha256(self.namespace + ids).digest()
+
+    def get(self, keys):
+        """
+        The cached classifications of the keys, keys that are not cached are missing
+        """
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    found[key] = self.entries[key]
+        LOOKUPS.labels("memory").inc(len(found))
+
+        missing = [key for key in keys if key not in found]
+        if self.path and missing:
+            from_disk = self.get_disk(missing)
+            LOOKUPS.labels("disk").inc(len(from_disk))
+            self.put_memory(from_disk)
+            found.update(from_disk)
+        LOOKUPS.labels("miss").inc(len(keys) - len(found))
+        return found
+
+    def put(self, classifications):
+        """
+        Cache the classifications of a dict of keys to classifications
+        """
+        self.put_memory(classifications)
+        if self.path and classifications:
+            self.put_disk(classifications)
+
+    def put_memory(self, classifications):
+        if not self.max_size:
+            return
+        with self.lock:
+            for key, classification in classifications.items():
+                self.entries[key] = classification
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def connection(self):
+        if getattr(self.local, "pid", None) != os.getpid():
+            self.local.db = sqlite3.connect(self.path, timeout=5)
+            self.local.pid = os.getpid()
+        return self.local.db
+
+    def get_disk(self, keys):
+        found = {}
+        try:
+            db = self.connection()
+            for i in range(0, len(keys), DISK_BATCH_SIZE):
+                batch = keys[i : i + DISK_BATCH_SIZE]
+                rows = db.execute(
+                    "SELECT key, label, score FROM chunks WHERE key IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for key, label, score in rows:
+                    found[key] = {"label": label, "score": score}
+        except sqlite3.Error:
+            # the cache is an optimization, classify the chunks instead
+            logger.warning("Reading the chunk cache failed", exc_info=True)
+        return found
+
+    def put_disk(self, classifications):
+        try:
+            db = self.connection()
+            with db:
+                db.executemany(
+                    "INSERT OR REPLACE INTO chunks (key, label, score) VALUES (?, ?, ?)",
+                    [
+                        (key, classification["label"], classification["score"])
+                        for key, classification in classifications.items()
+                    ],
+                )
+                if self.max_disk_size:
+                    # INSERT OR REPLACE gives every written row a new, larger rowid,
+                    # so the rows below the last max_disk_size rowids are the oldest
+                    db.execute(
+                        "DELETE FROM chunks WHERE rowid <= "
+                        "(SELECT MAX(rowid) FROM chunks) - ?",
+                        (self.max_disk_size,),
+                    )
+        except sqlite3.Error:
+            logger.warning("Writing the chunk cache failed", exc_info=True)
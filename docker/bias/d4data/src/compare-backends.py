@@ -0,0 +1,93 @@
+"""
+Compare the accuracy and latency of the inference backends against the TensorFlow
+model, e.g. before switching INFERENCE_BACKEND to onnx-int8.
+
+For every backend it reports the mean and p95 latency per text, the share of texts
+with the same label as the reference backend and the largest difference of the
+signed score (negative for Biased).
+
+Usage: python compare-backends.py [--backends tf,onnx,onnx-int8] [--repeat 5]
+"""
+
+import argparse
+import time
+
+import backends
+import app
+
+SENTENCES = [
+    "Women are naturally more nurturing than men.",
+    "Immigrants are responsible for the rise in crime rates.",
+    "The government's policies always favor the rich.",
+    "Men are better leaders than women.",
+    "Millennials are lazy and entitled.",
+    "The sun rises in the east.",
+    "Water freezes at 0 degrees Celsius.",
+    "The Earth orbits around the sun.",
+    "Plants require sunlight for photosynthesis.",
+    "The Earth is approximately 4.5 billion years old.",
+]
+ARTICLE = (
+    "The city council approved the new budget on Tuesday after a lengthy debate. "
+    "Supporters argued the plan invests in schools and public transport, while "
+    "critics warned that rising costs could force tax increases in the coming years. "
+)
+
+
+def signed_score(result):
+    return -result["score"] if result["label"] == "Biased" else result["score"]
+
+
+def run(texts, repeat):
+    """
+    Classify every text, return the results and the latencies in seconds
+    """
+    results = []
+    latencies = []
+    for text in texts:
+        chunks = app.chunk_text(text)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = app.combine_classifications(app.classify_chunks(chunks))
+        latencies.append((time.perf_counter() - start) / repeat)
+        results.append(result)
+    return results, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backends", default="tf,onnx,onnx-int8", help="comma separated"
+    )
+    parser.add_argument("--repeat", default=5, type=int, help="runs per text")
+    args = parser.parse_args()
+
+    texts = SENTENCES + [ARTICLE * 5, ARTICLE * 40]
+    reference = None
+    print(
+        f"{'backend':<10} {'mean [ms]':>10} {'p95 [ms]':>9} "
+        f"{'same label':>11} {'max score diff':>15}"
+    )
+    for name in args.backends.split(","):
+        app.backend = backends.load(name)
+        # the first forward pass initializes the backend, keep it out of the measurement
+        app.classify_chunks(app.chunk_text(SENTENCES[0]))
+        results, latencies = run(texts, args.repeat)
+        if reference is None:
+            reference = results
+
+        same = sum(r["label"] == ref["label"] for r, ref in zip(results, reference))
+        diff = max(
+            abs(signed_score(r) - signed_score(ref))
+            for r, ref in zip(results, reference)
+        )
+        latencies = sorted(latencies)
+        print(
+            f"{name:<10} {sum(latencies) / len(latencies) * 1000:>10.1f} "
+            f"{latencies[int(len(latencies) * 0.95)] * 1000:>9.1f} "
+            f"{same / len(texts):>11.0%} {diff:>15.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
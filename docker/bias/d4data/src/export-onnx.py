@@ -0,0 +1,34 @@
+"""
+Script to export the cached TensorFlow model to ONNX, and a dynamically quantized
+int8 variant of it, for the onnx and onnx-int8 inference backends. Run it after
+`cache-model.py` when building the docker image. Set `ONNX_DIR` to change where the
+models are written to.
+"""
+
+import os
+
+import tensorflow as tf
+import tf2onnx
+
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import TFAutoModelForSequenceClassification
+
+from backends import MODEL_NAME, ONNX_DIR, ONNX_FILES
+
+os.makedirs(ONNX_DIR, exist_ok=True)
+model_path = os.path.join(ONNX_DIR, ONNX_FILES["onnx"])
+int8_path = os.path.join(ONNX_DIR, ONNX_FILES["onnx-int8"])
+
+model = TFAutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+# dynamic batch size and sequence length
+input_signature = [
+    tf.TensorSpec((None, None), tf.int32, name="input_ids"),
+    tf.TensorSpec((None, None), tf.int32, name="attention_mask"),
+]
+tf2onnx.convert.from_keras(
+    model, input_signature=input_signature, opset=13, output_path=model_path
+)
+print(f"exported {model_path}")
+
+quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+print(f"quantized {int8_path}")
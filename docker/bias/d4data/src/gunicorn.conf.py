@@ -0,0 +1,36 @@
+"""
+gunicorn settings of the bias detection service.
+
+The app is imported once in the master before the workers are forked (preload_app),
+so the workers share the tokenizer and, with a backend that can be forked (see
+backends.fork_safe), the model weights copy-on-write. Every worker runs a warm-up
+inference after the fork, GET /ready answers 200 once it has finished.
+"""
+
+import os
+
+import backends
+
+# tokenizers disables its own parallelism after a fork anyway, this avoids the warning
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+bind = "0.0.0.0:5000"
+preload_app = os.getenv("PRELOAD_APP", "true") == "true"
+# A TensorFlow or multi-threaded ONNX Runtime worker uses all cores for a forward
+# pass, so one worker is enough. Single-threaded ONNX Runtime workers share the
+# weights and run one forward pass per core.
+workers = int(os.getenv("WORKERS", "0")) or (
+    len(os.sched_getaffinity(0))
+    if backends.fork_safe(os.getenv("INFERENCE_BACKEND", "tf"))
+    else 1
+)
+# concurrent requests of a worker share batches, see batcher.py
+threads = int(os.getenv("THREADS", "8"))
+# the first request of a TensorFlow worker may have to wait for the model to load
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+
+
+def post_worker_init(worker):
+    import app
+
+    app.start_warm_up()
@@ -0,0 +1,45 @@
+import sqlite3
+
+from chunk_cache import ChunkCache
+
+
+def classification(i):
+    return {"label": "Biased" if i % 2 else "Non-biased", "score": i / 100}
+
+
+def rows(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+
+def test_disk_cache_keeps_the_most_recently_written_rows(tmp_path):
+    path = str(tmp_path / "chunks.sqlite")
+    cache = ChunkCache(0, path, max_disk_size=10)
+    keys = [cache.key([101, i, 102]) for i in range(25)]
+    for i in range(0, 25, 5):
+        cache.put({key: classification(j) for j, key in enumerate(keys[i : i + 5], i)})
+
+    assert rows(path) == 10
+    found = cache.get(keys)
+    assert sorted(found) == sorted(keys[15:])
+    assert found[keys[20]] == classification(20)
+
+
+def test_rewritten_rows_count_as_recent(tmp_path):
+    path = str(tmp_path / "chunks.sqlite")
+    cache = ChunkCache(0, path, max_disk_size=3)
+    keys = [cache.key([i]) for i in range(4)]
+    for key in keys[:3]:
+        cache.put({key: classification(0)})
+    # the first key is written again and outlives the second one
+    cache.put({keys[0]: classification(0)})
+    cache.put({keys[3]: classification(0)})
+
+    assert sorted(cache.get(keys)) == sorted([keys[0], keys[2], keys[3]])
+
+
+def test_disk_cache_without_bound_keeps_all_rows(tmp_path):
+    path = str(tmp_path / "chunks.sqlite")
+    cache = ChunkCache(0, path)
+    cache.put({cache.key([i]): classification(i) for i in range(50)})
+    assert rows(path) == 50
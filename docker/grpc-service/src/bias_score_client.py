@@ -17,12 +17,14 @@ def determine_bias_score(input_string):
     url = f"{stage_url}/trustlevels"
     headers = {"Content-Type": "application/json", "x-api-key": stage_api_key}
     data = {"text": input_string}
-    logger.debug(f"Sending request to {url} with data: {data}")
+    logger.debug(
+        "Sending request to %s with data: %s", url, data, extra={"payload": True}
+    )
 
     try:
         response = requests.post(url, headers=headers, data=json.dumps(data))
         response.raise_for_status()  # Raises an error for bad HTTP status codes
-        logger.debug(f"Received response: {response}")
+        logger.debug("Received response: %s", response, extra={"payload": True})
 
         # Extract the desired field from the JSON response
         return (
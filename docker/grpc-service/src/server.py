@@ -10,6 +10,8 @@ sys.path.append("/usr/src/app/spec")
 from spec import trustlevel_pb2
 from spec import trustlevel_pb2_grpc
 
+import structured_logging
+
 LOGLEVEL = os.environ.get("LOGLEVEL", "INFO").upper()
 logger = logging.getLogger(__name__)
 logger.setLevel(level=LOGLEVEL)
@@ -24,19 +26,21 @@ _ONE_DAY_IN_SECONDS = 60 * 60 * 24
 
 class TrustlevelService(trustlevel_pb2_grpc.ServiceDefinitionServicer):
     def determineBias(self, request, context):
-        logging.info(f"Received request: {request}")
         input_string = request.input_string
+        logger.info("Received request: %s", structured_logging.preview(input_string))
         # Use the determine_bias_score function
         try:
             bias_score, explanations = determine_bias_score(input_string)
-            logging.info(
-                f"Determined bias score: {bias_score} for input: {input_string}"
+            logger.info(
+                "Determined bias score: %s for input: %s",
+                bias_score,
+                structured_logging.preview(input_string),
             )
             return trustlevel_pb2.BiasOutput(
                 score=bias_score, explanations=explanations
             )
         except Exception as e:
-            logging.error(f"Error in determine_bias_score: {e}")
+            logger.error("Error in determine_bias_score: %s", e)
             raise grpc.RpcError(grpc.StatusCode.INTERNAL, "Internal server error")
 
 
@@ -47,15 +51,15 @@ def serve():
     )
     server.add_insecure_port("[::]:7077")
     server.start()
-    logging.info("Server running on port 7077")
+    logger.info("Server running on port 7077")
     try:
         while True:
             time.sleep(_ONE_DAY_IN_SECONDS)
     except KeyboardInterrupt:
         server.stop(0)
-        logging.info("Server stopped")
+        logger.info("Server stopped")
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
+    structured_logging.setup("grpc-service", LOGLEVEL)
     serve()
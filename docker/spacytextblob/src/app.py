@@ -1,46 +1,99 @@
 from flask import Flask, request, jsonify
 import spacy
+from spacy.language import Language
+from spacy.tokens import Doc
 from spacytextblob.spacytextblob import SpacyTextBlob
-import logging
-from logging.handlers import RotatingFileHandler
-from logging.config import dictConfig
 import os
+import threading
+import time
 
-dictConfig({
-    'version': 1,
-    'formatters': {'default': {
-        'format': '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]',
-    }},
-    'handlers': {'wsgi': {
-        'class': 'logging.StreamHandler',
-        'stream': 'ext://sys.stdout',
-        'formatter': 'default',
-    }},
-    'root': {
-        'level': 'INFO',
-        'handlers': ['wsgi'],
-    }
-})
+import memory
+import structured_logging
 
-app = Flask(__name__)
+structured_logging.setup('spacytextblob')
 
-# Configure logging
-if not os.path.exists('logs'):
-    os.mkdir('logs')
-file_handler = RotatingFileHandler('logs/spacytextblob.log', maxBytes=10240, backupCount=10)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
+app = Flask(__name__)
 app.logger.info('SpacyTextBlob startup')
 
-# Load SpaCy and add spacytextblob to the pipeline
-nlp = spacy.load("en_core_web_sm")
-nlp.add_pipe('spacytextblob')
+# texts nlp.pipe analyzes together
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '64'))
+# processes nlp.pipe analyzes large batch requests in, starting them takes time, so
+# only requests of at least N_PROCESS * BATCH_SIZE texts use them
+N_PROCESS = int(os.getenv('N_PROCESS', '1'))
+# spacytextblob analyzes the text of the doc with TextBlob and needs none of the
+# components of en_core_web_sm, only its tokenizer is loaded
+UNUSED_COMPONENTS = ['tok2vec', 'tagger', 'parser', 'senter', 'attribute_ruler', 'lemmatizer', 'ner']
+
+Doc.set_extension('sentiment', default=None)
+
+@Language.component('sentiment')
+def sentiment(doc):
+    # plain values instead of the TextBlob of spacytextblob, nlp.pipe cannot send a
+    # TextBlob back from its processes
+    analysis = doc._.blob.sentiment_assessments
+    doc._.sentiment = {
+        'polarity': analysis.polarity,
+        'subjectivity': analysis.subjectivity,
+        'assessments': analysis.assessments
+    }
+    doc._.blob = None
+    return doc
+
+# Load SpaCy and add spacytextblob to the pipeline, blob_only skips the doc._.polarity,
+# doc._.subjectivity and doc._.assessments values, sentiment reads doc._.blob once
+nlp = spacy.load('en_core_web_sm', exclude=UNUSED_COMPONENTS)
+nlp.add_pipe('spacytextblob', config={'blob_only': True})
+nlp.add_pipe('sentiment')
 app.logger.info('Nlp setup complete')
 
+# set once the worker has finished its warm-up analysis
+ready = threading.Event()
+
+def result(doc, assessments=True):
+    analysis = dict(doc._.sentiment)
+    if not assessments:
+        del analysis['assessments']
+    return analysis
+
+def analyze(text, assessments=True):
+    return result(nlp(text), assessments)
+
+def analyze_texts(texts, assessments=True):
+    n_process = N_PROCESS if len(texts) >= N_PROCESS * BATCH_SIZE else 1
+    docs = nlp.pipe(texts, batch_size=BATCH_SIZE, n_process=n_process)
+    return [result(doc, assessments) for doc in docs]
+
+def analyze_one(text, assessments):
+    try:
+        return analyze(text, assessments)
+    except Exception:
+        app.logger.error('Error in processing text', exc_info=True)
+        return {'error': 'Error in processing request'}
+
+def include_assessments(data):
+    # assessments list every word with a sentiment, leave them out for smaller responses
+    assessments = data.get('assessments', True)
+    if not isinstance(assessments, bool):
+        raise ValueError('assessments must be true or false')
+    return assessments
+
+def warm_up():
+    start = time.perf_counter()
+    try:
+        analyze('This is a warm-up analysis.')
+    except Exception:
+        app.logger.error('Warm-up analysis failed', exc_info=True)
+        return
+    ready.set()
+    app.logger.info(
+        f'worker {os.getpid()} ready after {time.perf_counter() - start:.1f}s, '
+        f'memory [MiB]: {memory.memory_usage()}'
+    )
+
+def start_warm_up():
+    # in the background, so /health answers during the warm-up
+    threading.Thread(target=warm_up, daemon=True).start()
+
 @app.route('/analyze', methods=['POST'])
 def analyze_text():
     app.logger.info('Received request to analyze')
@@ -49,21 +102,56 @@ def analyze_text():
     if not text:
         app.logger.error('No text provided for analysis')
         return jsonify({'error': 'No text provided'}), 400
+    try:
+        assessments = include_assessments(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
+    preview_text = structured_logging.preview(text)
     try:
-        doc = nlp(text)
-        # Log only the first 30 characters of the text
-        preview_text = text[:30] + '...' if len(text) > 30 else text
-        app.logger.info(f'Analyzed text (preview): {preview_text}')
-        return jsonify({
-            'polarity': doc._.polarity,
-            'subjectivity': doc._.subjectivity,
-            'assessments': doc._.assessments
-        })
+        analysis = analyze(text, assessments)
+        app.logger.info('Analyzed text (preview): %s', preview_text)
+        return jsonify(analysis)
     except Exception as e:
-        app.logger.error(f'Error in processing text: {preview_text}', exc_info=True)
+        app.logger.error('Error in processing text: %s', preview_text, exc_info=True)
         return jsonify({'error': 'Error in processing request'}), 500
 
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    data = request.json
+    texts = data.get('texts')
+    if not isinstance(texts, list):
+        app.logger.error('No texts provided for analysis')
+        return jsonify({'error': 'No texts provided'}), 400
+    try:
+        assessments = include_assessments(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    app.logger.info('Received request to analyze %d texts', len(texts))
+
+    valid = [text for text in texts if text]
+    try:
+        analyzed = iter(analyze_texts(valid, assessments))
+    except Exception:
+        # one text failed the batch, analyze them one by one to find it
+        app.logger.error('Error in processing texts, retrying one by one', exc_info=True)
+        analyzed = iter(analyze_one(text, assessments) for text in valid)
+
+    results = [next(analyzed) if text else {'error': 'No text provided'} for text in texts]
+    return jsonify({'results': results})
+
+@app.route('/health', methods=['GET'])
+def health():
+    # liveness of this worker with its memory usage, see memory.py
+    return jsonify({'status': 'ok', 'pid': os.getpid(), 'memory': memory.memory_usage()})
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    if not ready.is_set():
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready'})
+
 
 if __name__ == '__main__':
+    start_warm_up()
     app.run(debug=True, host='0.0.0.0')
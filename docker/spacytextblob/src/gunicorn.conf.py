@@ -0,0 +1,22 @@
+"""
+gunicorn settings of the spacytextblob service.
+
+The app is imported once in the master before the workers are forked (preload_app),
+so the workers share the spaCy pipeline copy-on-write. Every worker runs a warm-up
+analysis after the fork, GET /ready answers 200 once it has finished.
+"""
+
+import os
+
+bind = '0.0.0.0:5000'
+preload_app = os.getenv('PRELOAD_APP', 'true') == 'true'
+# spaCy holds the GIL while it analyzes a text, so the CPU is used by workers and not
+# by threads: one worker per core, a second thread answers /health during long texts
+workers = int(os.getenv('WORKERS', '0')) or len(os.sched_getaffinity(0))
+threads = int(os.getenv('THREADS', '2'))
+
+
+def post_worker_init(worker):
+    import app
+
+    app.start_warm_up()
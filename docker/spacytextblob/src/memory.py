@@ -0,0 +1,88 @@
+"""
+Memory usage of the gunicorn master and its workers.
+
+With preload_app the workers share the pages the master loaded (the model weights)
+copy-on-write, so their RSS counts the shared pages once per worker. PSS splits
+shared pages between the processes sharing them and USS only counts the pages of
+the process itself: the sum of the PSS of all processes is the memory the container
+actually uses, and the USS of a worker is what one more worker would add.
+
+Usage: python memory.py (inside the container)
+
+The source of this module is shared/python/memory.py, the d4data and spacytextblob
+services have a copy written by scripts/sync_python_shared.sh.
+"""
+
+import os
+
+FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Private_Clean": "uss",
+    "Private_Dirty": "uss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+}
+
+
+def memory_usage(pid="self"):
+    """
+    RSS, PSS, USS and shared memory of a process in MiB, read from
+    /proc/<pid>/smaps_rollup (or smaps on kernels before 4.14)
+    """
+    usage = {"rss": 0.0, "pss": 0.0, "uss": 0.0, "shared": 0.0}
+    path = f"/proc/{pid}/smaps_rollup"
+    if not os.path.exists(path):
+        path = f"/proc/{pid}/smaps"
+    with open(path) as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in FIELDS:
+                # values are in kB
+                usage[FIELDS[name]] += int(value.split()[0]) / 1024
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def gunicorn_processes():
+    """
+    Pids of all gunicorn processes with the pid of their parent
+    """
+    processes = {}
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode()
+            with open(f"/proc/{pid}/stat") as f:
+                # the command in the second field may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        if "gunicorn" in cmdline:
+            processes[int(pid)] = ppid
+    return processes
+
+
+def main():
+    processes = gunicorn_processes()
+    total = 0.0
+    print(
+        f"{'pid':>7} {'role':<7} {'rss':>8} {'pss':>8} {'uss':>8} {'shared':>8}  [MiB]"
+    )
+    for pid, ppid in sorted(processes.items()):
+        try:
+            usage = memory_usage(pid)
+        except OSError:
+            continue
+        total += usage["pss"]
+        role = "worker" if ppid in processes else "master"
+        print(
+            f"{pid:>7} {role:<7} {usage['rss']:>8} {usage['pss']:>8} "
+            f"{usage['uss']:>8} {usage['shared']:>8}"
+        )
+    print(f"total pss: {total:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/bin/bash
+
+set -euo pipefail
+
+# Python modules used by several services live in shared/python. Every service is
+# built from its own directory (docker build context or Lambda bundle), so this
+# script copies each module into the services using it. Run it after changing a
+# module in shared/python, with --check it only fails if a copy differs.
+
+root="$(cd "$(dirname "$0")/.." && pwd)"
+
+# <module> <directory of a service using it>
+copies=(
+    "structured_logging.py workspaces/apis/content-score-api"
+    "structured_logging.py docker/bias/d4data/src"
+    "structured_logging.py docker/spacytextblob/src"
+    "structured_logging.py docker/grpc-service/src"
+    "memory.py docker/bias/d4data/src"
+    "memory.py docker/spacytextblob/src"
+)
+
+check=false
+if [ "${1:-}" == "--check" ]; then
+    check=true
+fi
+
+outdated=0
+for copy in "${copies[@]}"; do
+    read -r module directory <<< "$copy"
+    source="$root/shared/python/$module"
+    target="$root/$directory/$module"
+    if cmp -s "$source" "$target"; then
+        continue
+    fi
+    if [ "$check" == true ]; then
+        echo "❌ $directory/$module differs from shared/python/$module"
+        outdated=1
+    else
+        cp "$source" "$target"
+        echo "📄 Copied shared/python/$module to $directory"
+    fi
+done
+
+if [ "$outdated" == 1 ]; then
+    echo "Run scripts/sync_python_shared.sh to update the copies"
+    exit 1
+fi
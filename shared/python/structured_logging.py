@@ -0,0 +1,186 @@
+"""Non-blocking structured logging shared by the Python services.
+
+The logging call renders the message (and exception) of a record, as its arguments
+may change afterwards, and puts it on a bounded in-memory queue. A background thread
+serializes the records as JSON lines and writes them to stdout, so serializing and
+writing stay off the request path. If the queue is full, records are dropped
+instead of blocking the caller.
+
+Records that carry a payload (texts, prompts, model responses) are marked with
+extra={"payload": True}, only a sample of them (LOG_PAYLOAD_SAMPLE_RATE) is logged,
+all other records are logged at any level. Texts should be logged with preview(),
+every message is truncated to LOG_MAX_MESSAGE_LENGTH characters.
+
+The source of this module is shared/python/structured_logging.py, every service
+(content-score-api, d4data, spacytextblob and grpc-service) is built from its own
+directory and has a copy, written by scripts/sync_python_shared.sh. Change the
+source and run the script, with --check it fails if a copy differs.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# share of the records marked with extra={"payload": True} that is logged
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+# characters of a text logged by preview()
+LOG_PREVIEW_LENGTH = int(os.getenv("LOG_PREVIEW_LENGTH", "80"))
+LOG_MAX_MESSAGE_LENGTH = int(os.getenv("LOG_MAX_MESSAGE_LENGTH", "2000"))
+# records waiting to be written, further records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# attributes of every LogRecord, all others were passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_handler = None
+
+
+def preview(text, length=None):
+    """The beginning of a text with its length, for logging texts."""
+    length = LOG_PREVIEW_LENGTH if length is None else length
+    if text is None or len(text) <= length:
+        return text
+    return f"{text[:length]}... ({len(text)} chars)"
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats a record as a single line JSON object."""
+
+    def __init__(self, service=None):
+        super().__init__()
+        self.service = service
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > LOG_MAX_MESSAGE_LENGTH:
+            message = f"{message[:LOG_MAX_MESSAGE_LENGTH]}... ({len(message)} chars)"
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+            "service": self.service,
+            "pid": record.process,
+            "location": f"{record.module}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _PayloadSampler(logging.Filter):
+    def filter(self, record):
+        return (
+            not getattr(record, "payload", False)
+            or random.random() < LOG_PAYLOAD_SAMPLE_RATE
+        )
+
+
+class _BackgroundHandler(QueueHandler):
+    """Hands records to a QueueListener thread, which is restarted after a fork."""
+
+    def __init__(self, target):
+        super().__init__(queue.Queue(LOG_QUEUE_SIZE))
+        self.target = target
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.listener = QueueListener(self.queue, target, respect_handler_level=True)
+        self.listener.start()
+
+    def restart(self):
+        # the listener thread of the parent does not exist in a forked child, and the
+        # parent's queue may have been locked by it
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+        self.dropped_lock = threading.Lock()
+        self.listener = QueueListener(
+            self.queue, self.target, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, the message and the exception are rendered by
+        # the caller, as the arguments may change before the listener gets to the
+        # record. Only the JSON serialization and the write are left to the listener.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self.target.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        with self.dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        try:
+            if dropped:
+                self.queue.put_nowait(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": "Dropped %d log records, the log queue was full",
+                            "args": (dropped,),
+                        }
+                    )
+                )
+                dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # the records dropped before are reported with the next record
+            with self.dropped_lock:
+                self.dropped += dropped + 1
+
+    def flush(self):
+        self.queue.join()
+
+
+def setup(service=None, level=None):
+    """Log all records of the root logger as JSON lines via a background thread.
+
+    Args:
+        service: name of the service added to every record
+        level: level of the root logger, defaults to LOG_LEVEL
+    """
+    global _handler
+    target = logging.StreamHandler(sys.stdout)
+    target.setFormatter(JSONFormatter(service))
+    handler = _BackgroundHandler(target)
+    handler.addFilter(_PayloadSampler())
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level or LOG_LEVEL)
+
+    if _handler is None:
+        os.register_at_fork(after_in_child=lambda: _handler.restart())
+        atexit.register(lambda: _handler.listener.stop())
+    else:
+        _handler.listener.stop()
+    _handler = handler
+
+
+def flush():
+    """Block until all queued records are written, e.g. before a Lambda freezes."""
+    if _handler is not None:
+        _handler.flush()
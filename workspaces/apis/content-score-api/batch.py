@@ -0,0 +1,53 @@
+import asyncio
+
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+async def score_batch(
+    items: List[Item],
+    score: Callable[[Item], Awaitable[Result]],
+    key: Callable[[Item], Hashable],
+) -> AsyncIterator[Tuple[List[Item], Union[Result, Exception]]]:
+    """
+    Score a batch of items, scoring items with the same key only once.
+
+    Args:
+        items (List[Item]): The items to score.
+        score (Callable[[Item], Awaitable[Result]]): Scores a single item, expected to bound its own concurrency.
+        key (Callable[[Item], Hashable]): Items with the same key share one score call.
+
+    Yields:
+        Tuple[List[Item], Union[Result, Exception]]: The items sharing a key together with their
+        result or the exception raised while scoring them, in completion order.
+
+    """
+    groups: Dict[Hashable, List[Item]] = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+
+    tasks = {asyncio.create_task(score(group[0])): group for group in groups.values()}
+    try:
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield tasks[task], task.exception() or task.result()
+    finally:
+        # the client went away or the stream was closed early
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,270 @@
+"""
+Score a corpus of texts with the content-score-api models, without the HTTP API.
+
+Streams a JSONL or CSV file (optionally gzip compressed) and appends one JSON line per
+scored item to the output, items that failed are written to <output>.errors. Progress
+is checkpointed next to the output, so running the same command again after a crash
+resumes where it stopped without scoring items twice, and retries the failed items.
+
+Usage: python bulk.py corpus.jsonl.gz results.jsonl [--config config.json]
+       [--concurrency 8] [--rps 5] [--id-field id] [--text-field text]
+"""
+
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+import chunking
+import clients
+import fusion
+import main as service
+import metrics
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+
+def read_items(
+    path: str, id_field: str, text_field: str
+) -> Iterator[Tuple[int, str, Optional[str]]]:
+    """Yield (position, id, text) of every item without loading the whole file"""
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rt", encoding="utf-8", newline="") as file:
+        if name.endswith(".csv"):
+            csv.field_size_limit(sys.maxsize)
+            rows = csv.DictReader(file)
+        else:
+            rows = (json.loads(line) for line in file if line.strip())
+        for position, row in enumerate(rows):
+            yield position, str(row.get(id_field, position)), row.get(text_field)
+
+
+class Checkpoint:
+    """Checkpoint tracks which items are done and how much of the output is valid.
+
+    Items complete out of order, so it stores the position below which every item is
+    done, the done positions above it and the output size at that moment. Output
+    written after the last checkpoint is truncated on resume and scored again. Failed
+    items count as done for the position, but are kept apart and retried on resume.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.position = 0
+        self.done: Set[int] = set()
+        self.failed: Set[int] = set()
+        self.output_size = 0
+        self.loaded = os.path.exists(path)
+        if self.loaded:
+            with open(path) as file:
+                state = json.load(file)
+            self.position = state["position"]
+            self.done = set(state["done"])
+            self.failed = set(state.get("failed", []))
+            self.output_size = state["output_size"]
+
+    def is_done(self, position: int) -> bool:
+        if position in self.failed:
+            return False
+        return position < self.position or position in self.done
+
+    def mark_done(self, position: int, failed: bool = False) -> None:
+        if failed:
+            self.failed.add(position)
+        else:
+            self.failed.discard(position)
+        if position < self.position:
+            # a retried item of an earlier run
+            return
+        self.done.add(position)
+        while self.position in self.done:
+            self.done.remove(self.position)
+            self.position += 1
+
+    def save(self, output_size: int) -> None:
+        self.output_size = output_size
+        state = {
+            "position": self.position,
+            "done": sorted(self.done),
+            "failed": sorted(self.failed),
+            "output_size": output_size,
+        }
+        with open(f"{self.path}.tmp", "w") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class Progress:
+    """Progress reports items/s and OpenAI tokens/s at a fixed interval."""
+
+    def __init__(self, interval: float):
+        self.__interval = interval
+        self.__start = self.__last = time.perf_counter()
+        self.__tokens = metrics.total_tokens()
+        self.items = 0
+        self.errors = 0
+
+    def update(self, force: bool = False) -> None:
+        now = time.perf_counter()
+        if not force and now - self.__last < self.__interval:
+            return
+        self.__last = now
+        elapsed = max(now - self.__start, 1e-9)
+        tokens = metrics.total_tokens() - self.__tokens
+        print(
+            f"{self.items} items ({self.errors} errors) in {elapsed:.1f}s, "
+            f"{self.items / elapsed:.2f} items/s, {tokens / elapsed:.0f} tokens/s",
+            file=sys.stderr,
+        )
+
+
+async def score_corpus(args, config: tl.Config) -> Progress:
+    if args.overwrite and os.path.exists(f"{args.output}.checkpoint"):
+        os.remove(f"{args.output}.checkpoint")
+    checkpoint = Checkpoint(f"{args.output}.checkpoint")
+    if checkpoint.loaded:
+        output = open(args.output, "r+b")
+        # drop results written after the last checkpoint, they are scored again
+        output.truncate(checkpoint.output_size)
+        output.seek(checkpoint.output_size)
+    else:
+        output = open(args.output, "wb")
+    output = io.TextIOWrapper(output, encoding="utf-8", write_through=True)
+    # the items that failed in this run, they are retried by the next one
+    errors = open(f"{args.output}.errors", "w", encoding="utf-8")
+
+    progress = Progress(args.report_every)
+    window = asyncio.Semaphore(args.concurrency)
+    limiter = None
+    if args.model_concurrency > 0:
+        limiter = asyncio.Semaphore(args.model_concurrency)
+    interval = 1.0 / args.rps if args.rps else 0.0
+    next_start = time.perf_counter()
+    last_save = time.perf_counter()
+    tasks = set()
+
+    async def score(position: int, item_id: str, text: str) -> None:
+        nonlocal last_save
+        try:
+            if not text:
+                raise ValueError("Item has no text")
+            analyzers = service.modelsDict
+            if service.FUSE_MODELS:
+                analyzers = fusion.plan(
+                    text, config, analyzers, clients.async_openai_client()
+                )
+            result = await tl.content_quality_score_async(
+                text, config, analyzers, limiter
+            )
+            line: Dict[str, Any] = {
+                "id": item_id,
+                "trustlevel": result.score,
+                "explanations": result.explanations,
+                "scores": result.scores,
+            }
+        except Exception as e:
+            logger.error("Failed to score item %s", item_id, exc_info=True)
+            progress.errors += 1
+            errors.write(json.dumps({"id": item_id, "error": str(e)}) + "\n")
+            checkpoint.mark_done(position, failed=True)
+        else:
+            output.write(json.dumps(line) + "\n")
+            checkpoint.mark_done(position)
+        finally:
+            window.release()
+        progress.items += 1
+        progress.update()
+        if time.perf_counter() - last_save >= args.checkpoint_every:
+            output.flush()
+            checkpoint.save(output.buffer.tell())
+            last_save = time.perf_counter()
+
+    try:
+        for position, item_id, text in read_items(
+            args.input, args.id_field, args.text_field
+        ):
+            if checkpoint.is_done(position):
+                continue
+            await window.acquire()
+            if interval:
+                next_start = max(next_start + interval, time.perf_counter())
+                await asyncio.sleep(next_start - time.perf_counter())
+            task = asyncio.create_task(score(position, item_id, text))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        output.flush()
+        checkpoint.save(output.buffer.tell())
+        output.close()
+        errors.close()
+    progress.update(force=True)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="JSONL or CSV file, optionally .gz")
+    parser.add_argument("output", help="JSONL file the results are appended to")
+    parser.add_argument("--config", help="JSON file with the config, default model")
+    parser.add_argument("--id-field", default="id", help="field with the item id")
+    parser.add_argument("--text-field", default="text", help="field with the text")
+    parser.add_argument("--concurrency", default=8, type=int, help="items in flight")
+    parser.add_argument(
+        "--model-concurrency",
+        default=0,
+        type=int,
+        help="model calls in flight, 0 = unlimited",
+    )
+    parser.add_argument("--rps", default=0.0, type=float, help="items per second")
+    parser.add_argument("--checkpoint-every", default=5.0, type=float, help="seconds")
+    parser.add_argument("--report-every", default=10.0, type=float, help="seconds")
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="replace an existing output and checkpoint instead of resuming",
+    )
+    args = parser.parse_args()
+
+    # resuming needs both, anything else would truncate or pad an unrelated file
+    output_exists = os.path.exists(args.output)
+    if not args.overwrite and output_exists != os.path.exists(
+        f"{args.output}.checkpoint"
+    ):
+        problem = (
+            f"{args.output} exists without a checkpoint"
+            if output_exists
+            else f"{args.output}.checkpoint exists without {args.output}"
+        )
+        parser.error(f"{problem}, pass --overwrite to start over")
+
+    config = tl.Config(models=[service.defaultModel])
+    if args.config:
+        with open(args.config) as file:
+            config = tl.Config.model_validate(json.load(file))
+    try:
+        chunking.validate_config(config)
+    except ValueError as e:
+        parser.error(f"invalid config: {e}")
+
+    progress = asyncio.run(score_corpus(args, config))
+    if progress.errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pydantic import BaseModel
+from typing import Any, Dict, Iterator, Optional, Protocol
+
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize unicode and whitespace so trivially different copies share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def cache_key(
+    text: str, model: tl.ModelType, config: Dict[str, Any], variant: str = ""
+) -> str:
+    """
+    Build the content addressed key of an analyzer result.
+
+    Args:
+        text (str): The analyzed text.
+        model (ModelType): The model that analyzed the text.
+        config (Dict[str, Any]): The per-model configuration (TrustLevelConfig.model).
+        variant (str): How the model was run, e.g. "fused" for a result of a fused
+            call, empty for the model run alone.
+
+    Returns:
+        str: A hex digest identifying the (text, model, config, variant) tuple.
+
+    """
+    model_config = json.dumps(config, sort_keys=True, default=str) if config else ""
+    key = f"{text_hash(text)}|{tl.ModelType(model).value}|{model_config}"
+    if variant:
+        key = f"{key}|{variant}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+
+
+_request_stats: ContextVar[Optional[CacheStats]] = ContextVar(
+    "request_cache_stats", default=None
+)
+
+
+@contextmanager
+def track_request() -> Iterator[CacheStats]:
+    """Collect the cache hits and misses of the current request"""
+    stats = CacheStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached value or None if it is missing or expired"""
+        ...
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store the value, evicting the least recently used entries if needed"""
+        ...
+
+
+class MemoryBackend:
+    """In-process LRU cache with a time to live per entry."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__entries: OrderedDict[str, tuple] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        with self.__lock:
+            self.__entries[key] = (time.time() + self.__ttl, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+
+class SQLiteBackend:
+    """LRU cache with a time to live per entry persisted in a local SQLite file.
+
+    The file survives process restarts, e.g. a warm Lambda /tmp or a container volume.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.__connection.execute(
+            "CREATE INDEX IF NOT EXISTS scores_accessed_at ON scores (accessed_at)"
+        )
+        self.__connection.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        try:
+            with self.__lock, self.__connection:
+                row = self.__connection.execute(
+                    "SELECT value FROM scores WHERE key = ? AND expires_at >= ?",
+                    (key, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                self.__connection.execute(
+                    "UPDATE scores SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+            return json.loads(row[0])
+        except sqlite3.Error:
+            logger.warning("failed to read score cache", exc_info=True)
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        try:
+            with self.__lock, self.__connection:
+                self.__connection.execute(
+                    "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + self.__ttl, now),
+                )
+                self.__connection.execute(
+                    "DELETE FROM scores WHERE expires_at < ?", (now,)
+                )
+                self.__connection.execute(
+                    "DELETE FROM scores WHERE key IN (SELECT key FROM scores "
+                    "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.__max_entries,),
+                )
+        except sqlite3.Error:
+            logger.warning("failed to write score cache", exc_info=True)
+
+
+def create_backend(name: str, path: str, max_entries: int, ttl: float) -> CacheBackend:
+    if name == "memory":
+        return MemoryBackend(max_entries, ttl)
+    if name == "sqlite":
+        return SQLiteBackend(path, max_entries, ttl)
+    raise ValueError(f"Unknown score cache backend {name}")
+
+
+class ScoreCache:
+    """ScoreCache stores analyzer results by text, model and model config."""
+
+    def __init__(self, backend: CacheBackend):
+        self.__backend = backend
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.__backend.get(key)
+        request_stats = _request_stats.get()
+        if value is None:
+            self.stats.misses += 1
+            if request_stats is not None:
+                request_stats.misses += 1
+        else:
+            self.stats.hits += 1
+            if request_stats is not None:
+                request_stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.__backend.set(key, value)
+
+
+class CachedTextAnalyzer:
+    """CachedTextAnalyzer answers repeated analyze_text calls from a ScoreCache."""
+
+    def __init__(
+        self,
+        analyzer: tl.TextAnalyzer,
+        model: tl.ModelType,
+        cache: ScoreCache,
+        variant: str = "",
+    ):
+        self.__analyzer = analyzer
+        self.__model = model
+        self.__cache = cache
+        self.__variant = variant
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        key = cache_key(text, self.__model, config, self.__variant)
+        cached = self.__cache.get(key)
+        if cached is not None:
+            return cached
+        return self.__store(key, self.__analyzer.analyze_text(text, config))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        key = cache_key(text, self.__model, config, self.__variant)
+        cached = self.__cache.get(key)
+        if cached is not None:
+            return cached
+        result = await tl.analyze_text_async(self.__analyzer, text, config)
+        return self.__store(key, result)
+
+    def __store(self, key: str, result: Any) -> Dict[str, Any]:
+        value = tl.TextAnalyzerResponse.model_validate(result).model_dump(mode="json")
+        self.__cache.set(key, value)
+        return value
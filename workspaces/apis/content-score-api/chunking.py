@@ -0,0 +1,233 @@
+import asyncio
+import functools
+import logging
+import math
+import os
+
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import Any, Dict, List, Literal, Optional
+
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+# encoding of the gpt-3.5 and gpt-4 models
+ENCODING = "cl100k_base"
+# maximum number of chunks of a text, every chunk is one model call
+CHUNKING_MAX_CHUNKS = int(os.getenv("CHUNKING_MAX_CHUNKS", "50"))
+
+
+class ChunkingConfig(BaseModel):
+    """Settings of the chunked mode, passed as "chunking" in TrustLevelConfig.model"""
+
+    max_tokens: int = Field(default=2000, gt=0)
+    overlap: int = Field(default=0, ge=0)
+    reducer: Literal["mean", "length", "min"] = "mean"
+    concurrency: int = Field(default=4, gt=0)
+
+    @model_validator(mode="after")
+    def check_overlap(self) -> "ChunkingConfig":
+        # a large overlap makes a model call for every few tokens of the text
+        if self.overlap * 2 > self.max_tokens:
+            raise ValueError("overlap must be at most half of max_tokens")
+        return self
+
+
+def parse_config(chunking: Any) -> Optional[ChunkingConfig]:
+    """
+    Parse the "chunking" value of a model config.
+
+    Args:
+        chunking (Any): true for the defaults, an object with ChunkingConfig fields,
+            or a false value for the unchunked mode.
+
+    Returns:
+        Optional[ChunkingConfig]: The settings, None if chunking is disabled.
+
+    Raises:
+        ValueError: If the value is neither true nor a valid ChunkingConfig object.
+
+    """
+    if not chunking:
+        return None
+    if chunking is True:
+        return ChunkingConfig()
+    if not isinstance(chunking, dict):
+        raise ValueError("chunking must be true or an object")
+    try:
+        return ChunkingConfig.model_validate(chunking)
+    except ValidationError as e:
+        # errors of the model validator have no field
+        problems = ", ".join(
+            ": ".join(filter(None, [".".join(map(str, error["loc"])), error["msg"]]))
+            for error in e.errors()
+        )
+        raise ValueError(f"invalid chunking config ({problems})") from None
+
+
+def count_chunks(tokens: int, chunking: ChunkingConfig) -> int:
+    """The number of chunks split_text splits a text of tokens tokens into"""
+    if tokens <= chunking.max_tokens:
+        return 1
+    step = chunking.max_tokens - chunking.overlap
+    return math.ceil((tokens - chunking.max_tokens) / step) + 1
+
+
+def check_chunks(chunks: int, chunking: ChunkingConfig) -> None:
+    """Raise ValueError if a text needs more than CHUNKING_MAX_CHUNKS chunks"""
+    if chunks > CHUNKING_MAX_CHUNKS:
+        raise ValueError(
+            f"the text needs {chunks} chunks of {chunking.max_tokens} tokens, at most "
+            f"{CHUNKING_MAX_CHUNKS} are allowed"
+        )
+
+
+def validate_config(
+    config: Optional[tl.Config], text: str = None
+) -> Optional[tl.Config]:
+    """
+    Check the chunking settings of every model of a request config.
+
+    Args:
+        config (Optional[Config]): The request config.
+        text (str): The text of the request, if given it is checked that it needs at
+            most CHUNKING_MAX_CHUNKS chunks.
+
+    Returns:
+        Optional[Config]: The config.
+
+    Raises:
+        ValueError: If a chunking setting is invalid or the text needs too many chunks.
+
+    """
+    tokens = None
+    for model in config.models if config else []:
+        try:
+            chunking = parse_config((model.config.model or {}).get("chunking"))
+            if chunking is not None and text is not None:
+                if tokens is None:
+                    tokens = count_tokens(text)
+                check_chunks(count_chunks(tokens, chunking), chunking)
+        except ValueError as e:
+            raise ValueError(f"{model.name.value}: {e}") from None
+    return config
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(ENCODING)
+    except Exception as e:
+        # the encoding is downloaded on first use unless TIKTOKEN_CACHE_DIR has it
+        logger.warning("tiktoken is not available, chunking by words: %s", e)
+        return None
+
+
+def split_text(text: str, max_tokens: int, overlap: int = 0) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens.
+
+    Args:
+        text (str): The text to split.
+        max_tokens (int): The maximum number of tokens per chunk.
+        overlap (int): The number of tokens shared by consecutive chunks.
+
+    Returns:
+        List[str]: The chunks in text order.
+
+    """
+    encoding = _encoding()
+    tokens = encoding.encode(text) if encoding else text.split()
+    step = max(max_tokens - overlap, 1)
+    chunks = []
+    for start in range(0, max(len(tokens), 1), step):
+        window = tokens[start : start + max_tokens]
+        chunks.append(encoding.decode(window) if encoding else " ".join(window))
+        if start + max_tokens >= len(tokens):
+            break
+    return chunks
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    return len(encoding.encode(text)) if encoding else len(text.split())
+
+
+def reduce_scores(reducer: str, scores: List[float], lengths: List[int]) -> float:
+    if reducer == "min":
+        return min(scores)
+    if reducer == "length" and sum(lengths) > 0:
+        return sum(s * n for s, n in zip(scores, lengths)) / sum(lengths)
+    return sum(scores) / len(scores)
+
+
+class ChunkedTextAnalyzer:
+    """ChunkedTextAnalyzer scores long texts chunk by chunk and reduces the results.
+
+    The chunked mode is opt-in per model by setting "chunking" in the model config,
+    all other requests are passed through unchanged.
+    """
+
+    def __init__(self, analyzer: tl.TextAnalyzer):
+        self.__analyzer = analyzer
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Any:
+        chunking, config = self.__split_config(config)
+        if chunking is None:
+            return self.__analyzer.analyze_text(text, config)
+        chunks = self.__split_text(text, chunking)
+        results = [self.__analyzer.analyze_text(chunk, config) for chunk in chunks]
+        return self.__reduce(chunking, chunks, results)
+
+    async def analyze_text_async(self, text: str, config: Dict[str, Any]) -> Any:
+        chunking, config = self.__split_config(config)
+        if chunking is None:
+            return await tl.analyze_text_async(self.__analyzer, text, config)
+        chunks = self.__split_text(text, chunking)
+        limiter = asyncio.Semaphore(chunking.concurrency)
+
+        async def analyze(chunk: str):
+            async with limiter:
+                return await tl.analyze_text_async(self.__analyzer, chunk, config)
+
+        results = await asyncio.gather(*[analyze(chunk) for chunk in chunks])
+        return self.__reduce(chunking, chunks, results)
+
+    def __split_config(self, config: Dict[str, Any]):
+        chunking = parse_config((config or {}).get("chunking"))
+        if chunking is None:
+            return None, config
+        config = {key: value for key, value in config.items() if key != "chunking"}
+        return chunking, config or None
+
+    def __split_text(self, text: str, chunking: ChunkingConfig) -> List[str]:
+        chunks = split_text(text, chunking.max_tokens, chunking.overlap)
+        check_chunks(len(chunks), chunking)
+        return chunks
+
+    def __reduce(
+        self, chunking: ChunkingConfig, chunks: List[str], results: List[Any]
+    ) -> Dict[str, Any]:
+        results = [tl.TextAnalyzerResponse.model_validate(r) for r in results]
+        lengths = [count_tokens(chunk) for chunk in chunks]
+        explanations = []
+        for result in results:
+            for explanation in result.explanations or []:
+                if explanation not in explanations:
+                    explanations.append(explanation)
+        logger.info("reduced %d chunks with %s", len(chunks), chunking.reducer)
+        return {
+            "score": reduce_scores(
+                chunking.reducer, [r.score for r in results], lengths
+            ),
+            "details": {
+                "reducer": chunking.reducer,
+                "chunks": [
+                    {"tokens": n, "score": r.score, "details": r.details}
+                    for n, r in zip(lengths, results)
+                ],
+            },
+            "explanations": explanations,
+        }
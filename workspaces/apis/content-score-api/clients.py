@@ -0,0 +1,231 @@
+import asyncio
+import functools
+import importlib.util
+import logging
+import os
+import random
+import time
+
+import httpx
+import metrics
+import singleflight
+
+from openai import AsyncOpenAI, OpenAI
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# a single keep-alive pool per client is shared by all models so requests hitting
+# the same host in one request reuse connections instead of paying new TLS handshakes
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# HTTP/2 multiplexes concurrent model calls over one connection, needs the h2 package
+OPENAI_HTTP2 = os.getenv("OPENAI_HTTP2", "true").lower() == "true"
+
+# self-hosted model services (d4data, spacytextblob) share their own pool
+MODEL_SERVICE_MAX_CONNECTIONS = int(os.getenv("MODEL_SERVICE_MAX_CONNECTIONS", "20"))
+MODEL_SERVICE_TIMEOUT = float(os.getenv("MODEL_SERVICE_TIMEOUT", "30"))
+MODEL_SERVICE_MAX_RETRIES = int(os.getenv("MODEL_SERVICE_MAX_RETRIES", "2"))
+# texts sent in one /analyze/batch request, 1 sends every text on its own
+MODEL_SERVICE_BATCH_SIZE = int(os.getenv("MODEL_SERVICE_BATCH_SIZE", "1"))
+# milliseconds to wait for more texts before a partial batch is sent
+MODEL_SERVICE_BATCH_WAIT_MS = float(os.getenv("MODEL_SERVICE_BATCH_WAIT_MS", "10"))
+
+
+def _http_options():
+    http2 = OPENAI_HTTP2 and importlib.util.find_spec("h2") is not None
+    if OPENAI_HTTP2 and not http2:
+        logger.info("h2 is not installed, falling back to HTTP/1.1")
+    return {
+        "http2": http2,
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+        ),
+    }
+
+
+def _timeout():
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+@functools.lru_cache(maxsize=None)
+def openai_client() -> OpenAI:
+    """The OpenAI client shared by all models for sync calls"""
+    return OpenAI(
+        http_client=httpx.Client(
+            **_http_options(),
+            timeout=_timeout(),
+            event_hooks={"response": [metrics.record_usage]},
+        ),
+        timeout=_timeout(),
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def async_openai_client() -> AsyncOpenAI:
+    """The OpenAI client shared by all models for async calls"""
+    return AsyncOpenAI(
+        http_client=httpx.AsyncClient(
+            **_http_options(),
+            timeout=_timeout(),
+            event_hooks={"response": [metrics.record_usage_async]},
+        ),
+        timeout=_timeout(),
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+
+def openai_clients() -> Tuple[OpenAI, AsyncOpenAI]:
+    """The shared (sync, async) OpenAI clients passed to the models"""
+    return openai_client(), async_openai_client()
+
+
+class ServiceClient:
+    """ServiceClient calls the /analyze endpoint of a self-hosted model service.
+
+    Failed requests are retried with exponential backoff if the service is unreachable
+    or answers with 429 or 5xx. Concurrent async requests for the same text share one
+    call, and with a batch_size above 1 the texts of concurrent requests are sent
+    together to /analyze/batch.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        base_url: str,
+        client: httpx.Client,
+        async_client: httpx.AsyncClient,
+        max_retries: int = 2,
+        batch_size: int = 1,
+        batch_wait: float = 0.01,
+    ):
+        self.__base_url = base_url.rstrip("/")
+        self.__client = client
+        self.__async_client = async_client
+        self.__max_retries = max_retries
+        self.__batch_size = batch_size
+        self.__batch_wait = batch_wait
+        self.__flights = singleflight.SingleFlight()
+        self.__pending: List[Tuple[str, asyncio.Future]] = []
+        self.__timer: asyncio.TimerHandle = None
+
+    def analyze(self, text: str) -> Dict[str, Any]:
+        for attempt in range(self.__max_retries + 1):
+            try:
+                response = self.__client.post(
+                    f"{self.__base_url}/analyze", json={"text": text}
+                )
+                return self.__check(response, attempt)
+            except httpx.TransportError:
+                if attempt == self.__max_retries:
+                    raise
+            except _Retry:
+                pass
+            time.sleep(self.__backoff(attempt))
+
+    async def analyze_async(self, text: str) -> Dict[str, Any]:
+        if self.__batch_size > 1:
+            return await self.__flights.do(text, lambda: self.__enqueue(text))
+        return await self.__flights.do(
+            text, lambda: self.__post_async("/analyze", {"text": text})
+        )
+
+    async def __post_async(self, path: str, body: Dict[str, Any]) -> Any:
+        for attempt in range(self.__max_retries + 1):
+            try:
+                response = await self.__async_client.post(
+                    f"{self.__base_url}{path}", json=body
+                )
+                return self.__check(response, attempt)
+            except httpx.TransportError:
+                if attempt == self.__max_retries:
+                    raise
+            except _Retry:
+                pass
+            await asyncio.sleep(self.__backoff(attempt))
+
+    def __check(self, response: httpx.Response, attempt: int) -> Any:
+        if response.status_code in self.RETRY_STATUS and attempt < self.__max_retries:
+            logger.warning(
+                "%s answered %s, retrying", response.url, response.status_code
+            )
+            raise _Retry()
+        response.raise_for_status()
+        return response.json()
+
+    def __backoff(self, attempt: int) -> float:
+        return 0.1 * 2**attempt * random.uniform(0.5, 1.5)
+
+    async def __enqueue(self, text: str) -> Dict[str, Any]:
+        future = asyncio.get_running_loop().create_future()
+        self.__pending.append((text, future))
+        if len(self.__pending) >= self.__batch_size:
+            self.__flush()
+        elif self.__timer is None:
+            self.__timer = asyncio.get_running_loop().call_later(
+                self.__batch_wait, self.__flush
+            )
+        return await future
+
+    def __flush(self) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        batch, self.__pending = self.__pending, []
+        if batch:
+            asyncio.ensure_future(self.__send(batch))
+
+    async def __send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            response = await self.__post_async(
+                "/analyze/batch", {"texts": [text for text, _ in batch]}
+            )
+            for (_, future), result in zip(batch, response["results"]):
+                if future.done():
+                    continue
+                if "error" in result:
+                    future.set_exception(RuntimeError(result["error"]))
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class _Retry(Exception):
+    pass
+
+
+@functools.lru_cache(maxsize=None)
+def _service_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    options = {
+        "limits": httpx.Limits(
+            max_connections=MODEL_SERVICE_MAX_CONNECTIONS,
+            max_keepalive_connections=MODEL_SERVICE_MAX_CONNECTIONS,
+        ),
+        "timeout": httpx.Timeout(MODEL_SERVICE_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    }
+    return httpx.Client(**options), httpx.AsyncClient(**options)
+
+
+@functools.lru_cache(maxsize=None)
+def service_client(base_url: str) -> ServiceClient:
+    """The client of the model service at base_url, shared by all its models"""
+    return ServiceClient(
+        base_url,
+        *_service_http_clients(),
+        max_retries=MODEL_SERVICE_MAX_RETRIES,
+        batch_size=MODEL_SERVICE_BATCH_SIZE,
+        batch_wait=MODEL_SERVICE_BATCH_WAIT_MS / 1000,
+    )
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+
+from collections import ChainMap
+from openai import AsyncOpenAI
+from typing import Any, Dict, List, Mapping
+
+import metrics
+import registry
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+
+class FusedCall:
+    """FusedCall scores a text for several models with a single function call.
+
+    Every fusable model provides the JSON schema of its answer (fusion_schema) and
+    parses its part of the combined answer (from_fused). The call is made once, when
+    the first member asks for its result.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str,
+        text: str,
+        analyzers: Dict[tl.ModelType, tl.TextAnalyzer],
+    ):
+        self.__client = client
+        self.__model = model
+        self.__task: asyncio.Task = None
+        self.text = text
+        self.analyzers = analyzers
+
+    async def result(self) -> Dict[str, Any]:
+        if self.__task is None:
+            self.__task = asyncio.ensure_future(self.__call())
+        return await asyncio.shield(self.__task)
+
+    async def __call(self) -> Dict[str, Any]:
+        logger.info(
+            "score %s in a single call", [model.value for model in self.analyzers]
+        )
+        # the tokens of the shared call are not attributable to one of the models
+        with metrics.attribute("fused"):
+            response = await self.__create()
+        arguments = response.choices[0].message.tool_calls[0].function.arguments
+        return json.loads(arguments)
+
+    async def __create(self):
+        return await self.__client.chat.completions.create(
+            model=self.__model,
+            temperature=0,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You will be provided with text delimited by triple quotes for which you determine every score described by the score_text function.",
+                },
+                {"role": "user", "content": f'"""{self.text}"""'},
+            ],
+            tools=[{"type": "function", "function": self.function()}],
+            tool_choice={"type": "function", "function": {"name": "score_text"}},
+        )
+
+    def function(self) -> Dict[str, Any]:
+        return {
+            "name": "score_text",
+            "description": "Scores of the text",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    model.name: analyzer.fusion_schema
+                    for model, analyzer in self.analyzers.items()
+                },
+                "required": [model.name for model in self.analyzers],
+            },
+        }
+
+
+class FusedMember:
+    """FusedMember answers a single model from the result of a FusedCall."""
+
+    def __init__(self, call: FusedCall, model: tl.ModelType):
+        self.__call = call
+        self.__model = model
+        self.__analyzer = call.analyzers[model]
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Any:
+        return self.__analyzer.analyze_text(text, config)
+
+    async def analyze_text_async(self, text: str, config: Dict[str, Any]) -> Any:
+        if text != self.__call.text:
+            return await tl.analyze_text_async(self.__analyzer, text, config)
+        result = await self.__call.result()
+        try:
+            return self.__analyzer.from_fused(result[self.__model.name])
+        except Exception:
+            logger.warning(
+                "invalid fused result for %s, scoring it alone",
+                self.__model.value,
+                exc_info=True,
+            )
+            return await tl.analyze_text_async(self.__analyzer, text, config)
+
+
+def fusable(model: tl.Model) -> bool:
+    """Models can opt out with {"fuse": false}, chunked models always run alone"""
+    config = model.config.model or {}
+    return config.get("fuse", True) and not config.get("chunking")
+
+
+def plan(
+    text: str,
+    config: tl.Config,
+    models: registry.ModelRegistry,
+    client: AsyncOpenAI,
+) -> Mapping[tl.ModelType, tl.TextAnalyzer]:
+    """
+    Merge the fusable models of a config into one call per OpenAI model.
+
+    Args:
+        text (str): The text to score.
+        config (Config): The requested models.
+        models (ModelRegistry): The available models.
+        client (AsyncOpenAI): The client used for the fused calls.
+
+    Returns:
+        Mapping[ModelType, TextAnalyzer]: The analyzers to score the text with, fused
+        models are answered from a shared call and all others come from models.
+
+    """
+    groups: Dict[str, List[tl.ModelType]] = {}
+    for model in config.models:
+        if model.name not in models or not fusable(model):
+            continue
+        analyzer = models.unwrapped(model.name)
+        if not hasattr(analyzer, "from_fused"):
+            continue
+        group = groups.setdefault(analyzer.fusion_model, [])
+        if model.name not in group:
+            group.append(model.name)
+
+    fused = {}
+    for fusion_model, names in groups.items():
+        if len(names) < 2:
+            continue
+        call = FusedCall(
+            client,
+            fusion_model,
+            text,
+            {name: models.unwrapped(name) for name in names},
+        )
+        # a fused answer may differ from the answer of the model alone, so it is
+        # cached and coalesced separately
+        for name in names:
+            fused[name] = models.wrap(name, FusedMember(call, name), "fused")
+    return ChainMap(fused, models)
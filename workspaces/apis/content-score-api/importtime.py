@@ -0,0 +1,60 @@
+"""
+Report the startup time of the content-score-api to track cold start regressions.
+
+Prints the modules with the highest import time (measured with `python -X importtime`
+in a fresh interpreter) and, optionally, the time it takes to load each model.
+
+Usage: python importtime.py [--module main] [--top 20] [--models]
+"""
+
+import argparse
+import subprocess
+import sys
+
+
+def import_times(module: str):
+    """Return (self, cumulative, module) import times in microseconds"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        times.append((int(own), int(cumulative), name.strip()))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--top", default=20, type=int, help="modules to show")
+    parser.add_argument(
+        "--models", action="store_true", help="also load every registered model"
+    )
+    args = parser.parse_args()
+
+    times = import_times(args.module)
+    total = next(cumulative for _, cumulative, name in times if name == args.module)
+    print(f"import {args.module}: {total / 1e6:.3f}s")
+    print(f"{'cumulative [s]':>14} {'self [s]':>10}  module")
+    for own, cumulative, name in sorted(times, key=lambda t: t[1], reverse=True)[
+        : args.top
+    ]:
+        print(f"{cumulative / 1e6:>14.3f} {own / 1e6:>10.3f}  {name}")
+
+    if args.models:
+        import main as app
+
+        app.modelsDict.prewarm(app.modelsDict)
+        print(f"{'load [s]':>14}  model")
+        for model, seconds in app.modelsDict.load_times.items():
+            print(f"{seconds:>14.3f}  {model.value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Offline stand-in for the OpenAI chat completions API.
+
+Answers every request shape used by the models with schema-valid random data after a
+configurable latency, so the service can be load tested without network or costs:
+tool calls (`tools`), legacy function calls (`functions`) and plain JSON replies whose
+fields are taken from the prompt.
+
+Usage: python -m loadtest.fake_openai [--port 8001] [--latency lognormal:0.8,0.3]
+       [--latency gpt-4-turbo=lognormal:3,0.3]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+
+import uvicorn
+
+from fastapi import FastAPI, Request
+from typing import Any, Callable, Dict
+
+Latency = Callable[[], float]
+
+
+def parse_latency(spec: str) -> Latency:
+    """
+    Parse a latency distribution.
+
+    Args:
+        spec (str): `none`, `fixed:<s>`, `uniform:<min>,<max>`, `normal:<mean>,<stddev>`
+            or `lognormal:<median>,<sigma>` with values in seconds.
+
+    Returns:
+        Latency: A function returning a random latency in seconds.
+
+    """
+    name, _, values = spec.partition(":")
+    args = [float(value) for value in values.split(",") if value]
+    if name == "none":
+        return lambda: 0.0
+    if name == "fixed":
+        return lambda: args[0]
+    if name == "uniform":
+        return lambda: random.uniform(args[0], args[1])
+    if name == "normal":
+        return lambda: max(random.gauss(args[0], args[1]), 0.0)
+    if name == "lognormal":
+        return lambda: random.lognormvariate(0.0, args[1]) * args[0]
+    raise ValueError(f"Unknown latency distribution {spec}")
+
+
+def fake_value(schema: Dict[str, Any], root: Dict[str, Any]) -> Any:
+    """Generate a random instance of a JSON schema"""
+    if "$ref" in schema:
+        definition = root
+        for part in schema["$ref"].lstrip("#/").split("/"):
+            definition = definition[part]
+        return fake_value(definition, root)
+    if "allOf" in schema:
+        return fake_value(schema["allOf"][0], root)
+    kind = schema.get("type", "object")
+    if kind == "number":
+        # every model scores in [-1.0, 1.0]; [0.0, 1.0] is valid for all of them
+        return round(random.uniform(0.0, 1.0), 2)
+    if kind == "integer":
+        return random.randint(0, 10)
+    if kind == "boolean":
+        return random.random() < 0.5
+    if kind == "string":
+        return "fake reasoning"
+    if kind == "array":
+        return [fake_value(schema.get("items", {}), root) for _ in range(2)]
+    return {
+        name: fake_value(property, root)
+        for name, property in schema.get("properties", {}).items()
+    }
+
+
+def json_reply(prompt: str) -> Dict[str, Any]:
+    """Plain JSON answer for the prompting models, the fields are taken from the prompt"""
+    schema = re.search(r"```\n(\{.*\})\n```", prompt, re.DOTALL)
+    if schema:
+        # langchain JsonOutputParser format instructions
+        schema = json.loads(schema.group(1))
+        return fake_value(schema, schema)
+    reply = {}
+    for field in re.findall(r'\("(\w+)"\)', prompt):
+        reply[field] = fake_value({"type": "number"}, {})
+    for field in re.findall(r'field called "(\w+)"', prompt):
+        reply[field] = "fake reasoning"
+    return reply
+
+
+def message(body: Dict[str, Any]) -> Dict[str, Any]:
+    if body.get("tools"):
+        choice = body.get("tool_choice")
+        tools = [tool["function"] for tool in body["tools"]]
+        function = next(
+            (
+                tool
+                for tool in tools
+                if isinstance(choice, dict)
+                and tool["name"] == choice["function"]["name"]
+            ),
+            tools[0],
+        )
+        parameters = function.get("parameters", {})
+        arguments = fake_value(parameters, parameters)
+        return {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{random.getrandbits(32):08x}",
+                    "type": "function",
+                    "function": {
+                        "name": function["name"],
+                        "arguments": json.dumps(arguments),
+                    },
+                }
+            ],
+        }
+    if body.get("functions"):
+        function = body["functions"][0]
+        parameters = function.get("parameters", {})
+        arguments = fake_value(parameters, parameters)
+        return {
+            "role": "assistant",
+            "content": None,
+            "function_call": {
+                "name": function["name"],
+                "arguments": json.dumps(arguments),
+            },
+        }
+    prompt = "\n".join(str(m.get("content", "")) for m in body["messages"])
+    return {"role": "assistant", "content": json.dumps(json_reply(prompt))}
+
+
+def create_app(latency: Latency, model_latencies: Dict[str, Latency]) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "gpt-3.5-turbo")
+        await asyncio.sleep(model_latencies.get(model, latency)())
+
+        reply = message(body)
+        # rough token estimate, 4 characters per token
+        prompt_tokens = len(json.dumps(body["messages"])) // 4
+        completion_tokens = len(json.dumps(reply)) // 4
+        return {
+            "id": f"chatcmpl-{random.getrandbits(64):016x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": reply,
+                    "finish_reason": "tool_calls" if "tool_calls" in reply else "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+def create_app_from_specs(specs) -> FastAPI:
+    """Build the app from `--latency` style specs, `<model>=<spec>` sets a model latency"""
+    latency = parse_latency("none")
+    model_latencies = {}
+    for spec in specs or []:
+        model, _, distribution = spec.rpartition("=")
+        if model:
+            model_latencies[model] = parse_latency(distribution)
+        else:
+            latency = parse_latency(distribution)
+    return create_app(latency, model_latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1", type=str, help="host")
+    parser.add_argument("--port", default=8001, type=int, help="port")
+    parser.add_argument(
+        "--latency",
+        action="append",
+        help="latency distribution, optionally per model as <model>=<spec>",
+    )
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app_from_specs(args.latency),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+if __name__ == "__main__":
+    main()
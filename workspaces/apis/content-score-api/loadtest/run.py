@@ -0,0 +1,190 @@
+"""
+Load test of /trustlevels at a fixed request rate.
+
+Drives `main.app` in-process (or a running service with --url) and reports latency
+percentiles, throughput and errors per model. With --fake-openai the fake OpenAI server
+is started in the background and the service is pointed at it, so the run needs no
+network and measures the overhead of the service itself.
+
+Usage: python -m loadtest.run [--rps 20] [--concurrency 50] [--duration 30]
+       [--model bias/openai/gpt-4-v1 ...] [--combined]
+       [--fake-openai lognormal:0.8,0.3 ...] [--max-p95 <s>]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from typing import Dict, List
+
+from loadtest import fake_openai
+
+SAMPLE_TEXT = (
+    "The city council approved the new budget on Tuesday after a lengthy debate. "
+    "Supporters argued the plan invests in schools and public transport, while "
+    "critics warned that rising costs could force tax increases in the coming years. "
+)
+
+
+def start_fake_openai(specs: List[str]) -> str:
+    """Run the fake OpenAI server in a background thread and return its base url"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(
+            fake_openai.create_app_from_specs(specs),
+            host="127.0.0.1",
+            port=port,
+            log_level="warning",
+        )
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def scenarios(models: List[str], combined: bool) -> Dict[str, dict]:
+    def config(names):
+        return {"models": [{"name": n, "config": {"activation": {}}} for n in names]}
+
+    result = {name: config([name]) for name in models}
+    if combined and len(models) > 1:
+        result["combined"] = config(models)
+    return result
+
+
+async def run(client: httpx.AsyncClient, args, configs: Dict[str, dict]):
+    names = list(configs)
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    limiter = asyncio.Semaphore(args.concurrency)
+    words = (SAMPLE_TEXT * (args.words // len(SAMPLE_TEXT.split()) + 1)).split()
+    text = " ".join(words[: args.words])
+
+    async def request(i: int, scheduled: float):
+        name = names[i % len(names)]
+        # a unique text per request keeps the score cache out of the measurement
+        body = {"text": f"[{i}] {text}" if args.unique else text}
+        body["config"] = configs[name]
+        async with limiter:
+            try:
+                response = await client.post("/trustlevels", json=body)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                errors[name] += 1
+                if errors[name] == 1:
+                    print(f"{name}: {e!r}", file=sys.stderr)
+                return
+        # measured from the scheduled send time so client side queueing counts
+        latencies[name].append(time.perf_counter() - scheduled)
+
+    total = int(args.rps * args.duration)
+    start = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = start + i / args.rps
+        await asyncio.sleep(max(scheduled - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(request(i, scheduled)))
+    await asyncio.gather(*tasks)
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(latencies, errors, elapsed) -> float:
+    print(
+        f"{'scenario':<34} {'requests':>8} {'errors':>6} {'req/s':>7} "
+        f"{'p50 [s]':>8} {'p95 [s]':>8} {'p99 [s]':>8}"
+    )
+    rows = dict(latencies)
+    rows["all"] = [value for values in latencies.values() for value in values]
+    total_errors = dict(errors, all=sum(errors.values()))
+    for name, values in rows.items():
+        print(
+            f"{name:<34} {len(values) + total_errors[name]:>8} "
+            f"{total_errors[name]:>6} {len(values) / elapsed:>7.1f} "
+            f"{percentile(values, 50):>8.3f} {percentile(values, 95):>8.3f} "
+            f"{percentile(values, 99):>8.3f}"
+        )
+    return percentile(rows["all"], 95)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="service url, default: main.app in-process")
+    parser.add_argument("--rps", default=10.0, type=float, help="requests per second")
+    parser.add_argument(
+        "--concurrency", default=50, type=int, help="requests in flight"
+    )
+    parser.add_argument("--duration", default=30.0, type=float, help="seconds")
+    parser.add_argument("--words", default=300, type=int, help="words per text")
+    parser.add_argument(
+        "--model", action="append", help="model to test, default: all OpenAI models"
+    )
+    parser.add_argument(
+        "--combined", action="store_true", help="also test all models in one config"
+    )
+    parser.add_argument(
+        "--no-unique",
+        dest="unique",
+        action="store_false",
+        help="send the same text every time to measure cache hits",
+    )
+    parser.add_argument(
+        "--fake-openai",
+        action="append",
+        metavar="LATENCY",
+        help="start the fake OpenAI server with this latency (see fake_openai.py)",
+    )
+    parser.add_argument(
+        "--max-p95", type=float, help="exit with 1 if the overall p95 exceeds it"
+    )
+    args = parser.parse_args()
+
+    if args.fake_openai:
+        os.environ["OPENAI_BASE_URL"] = start_fake_openai(args.fake_openai)
+        os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    import trustlevel as tl
+
+    # the self-hosted models need their services running, test them with --model
+    models = args.model or [
+        model.value for model in tl.ModelType if "/openai/" in model.value
+    ]
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+    else:
+        import main as service
+
+        # keep model loading out of the measurement
+        service.modelsDict.prewarm(models)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=service.app),
+            base_url="http://content-score-api",
+            timeout=None,
+        )
+    latencies, errors, elapsed = asyncio.run(
+        run(client, args, scenarios(models, args.combined))
+    )
+    p95 = report(latencies, errors, elapsed)
+    if args.max_p95 is not None and p95 > args.max_p95:
+        print(f"p95 {p95:.3f}s exceeds {args.max_p95:.3f}s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,60 @@
+import asyncio
+import json
+import math
 import os
+import batch
+import cache as score_cache
+import chunking
+import clients
+import fusion
 import models
 import logging
+import metrics
+import registry
+import rescore
+import singleflight
+import structured_logging
 import trustlevel as tl
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi import Response as FastAPIResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from mangum import Mangum
-from pydantic import BaseModel
-from openai import OpenAI
-from typing import Dict, Any, List
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, model_validator
+from typing import Dict, Any, List, Optional
 
 
-logging.basicConfig(level=logging.INFO)
+structured_logging.setup("content-score-api")
 logger = logging.getLogger(__name__)
 
 logger.info("Starting content-score-api")
 
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "[http://localhost:8080]")
+# maximum number of model calls running concurrently per request (0 = unlimited)
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "0"))
+# seconds after which a request returns with the models finished so far (0 = none)
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "0"))
+# maximum number of model calls running concurrently per batch request
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+# score cache backend: memory, sqlite or none
+SCORE_CACHE_BACKEND = os.getenv("SCORE_CACHE_BACKEND", "memory")
+SCORE_CACHE_PATH = os.getenv("SCORE_CACHE_PATH", "/tmp/score-cache.sqlite3")
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "1024"))
+SCORE_CACHE_TTL_SECONDS = float(os.getenv("SCORE_CACHE_TTL_SECONDS", "86400"))
+# share one model call between identical concurrent requests
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "true").lower() == "true"
+# score compatible models of a request with a single OpenAI call
+FUSE_MODELS = os.getenv("FUSE_MODELS", "false").lower() == "true"
+# SQLite file storing the raw model scores for re-scoring sweeps (empty = disabled)
+RAW_SCORE_STORE_PATH = os.getenv("RAW_SCORE_STORE_PATH", "")
+# base urls of the self-hosted model services
+BIASD4DATA_URL = os.getenv("BIASD4DATA_URL", "http://localhost:8080")
+SPACYTEXTBLOB_URL = os.getenv("SPACYTEXTBLOB_URL", "http://localhost:4000")
+# comma separated model names loaded at startup instead of on first use
+PREWARM_MODELS = os.getenv("PREWARM_MODELS", "")
 
 app = FastAPI()
 
@@ -38,11 +76,19 @@ app.add_middleware(
 class Request(BaseModel):
     text: str
     config: tl.Config = None
+    # overrides REQUEST_DEADLINE_SECONDS
+    deadline: float = None
+
+    @model_validator(mode="after")
+    def check_chunking(self):
+        chunking.validate_config(self.config, self.text)
+        return self
 
 
 class Metadata(BaseModel):
     config: tl.Config
     scores: Dict[str, Dict[str, Any]]
+    cache: score_cache.CacheStats = None
 
 
 class Response(BaseModel):
@@ -51,20 +97,110 @@ class Response(BaseModel):
     metadata: Metadata = None
 
 
-client = OpenAI()
+class BatchItem(BaseModel):
+    id: str
+    text: str
+    config: tl.Config = None
+
+    @model_validator(mode="after")
+    def check_chunking(self):
+        chunking.validate_config(self.config, self.text)
+        return self
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+
+
+class RescoreRequest(BaseModel):
+    configs: List[tl.Config]
+    texts: List[str] = None
+    text_hashes: List[str] = None
+
+
+class RescoreResponse(BaseModel):
+    text_hashes: List[str]
+    # one row per text and one column per config, None if a model score is missing
+    trustlevels: List[List[Optional[float]]]
+
 
+scoreCache = None
+if SCORE_CACHE_BACKEND != "none":
+    logger.info("Add %s score cache", SCORE_CACHE_BACKEND)
+    scoreCache = score_cache.ScoreCache(
+        score_cache.create_backend(
+            SCORE_CACHE_BACKEND,
+            SCORE_CACHE_PATH,
+            SCORE_CACHE_MAX_ENTRIES,
+            SCORE_CACHE_TTL_SECONDS,
+        )
+    )
 
-# TODO: initialize OpenAI client and pass it to the models
-modelsDict = {
-    tl.ModelType.polarity_openai_gpt3_5_v1: models.PolarityOpenAIGPT35V1(client),
-    tl.ModelType.objectivity_openai_gpt3_5_v1: models.ObjectivityOpenAIGPT35V1(client),
-    tl.ModelType.bias_openai_gpt3_5_v0: models.BiasOpenAIGPT35V0(client),
-    tl.ModelType.bias_openai_gpt3_5_v1: models.BiasOpenAIGPT35V1(),
-    tl.ModelType.bias_openai_gpt3_5_v2: models.BiasOpenAIGPT35V2(),
-    tl.ModelType.trustlevel_openai_gpt3_5_v1: models.TrustLevelOpenAIGPT35V1(),
-    tl.ModelType.trustlevel_openai_gpt3_5_v2: models.TrustLevelOpenAIGPT35V2(),
-    tl.ModelType.bias_openai_gpt4_v1: models.BiasOpenAIGPT4FewShotV1(),
-}
+
+rawScores = None
+if RAW_SCORE_STORE_PATH:
+    logger.info("Add raw score store %s", RAW_SCORE_STORE_PATH)
+    rawScores = rescore.RawScoreStore(RAW_SCORE_STORE_PATH)
+
+
+flights = singleflight.SingleFlight()
+
+
+def wrap(
+    model: tl.ModelType, analyzer: tl.TextAnalyzer, variant: str = ""
+) -> tl.TextAnalyzer:
+    if COALESCE_REQUESTS:
+        analyzer = singleflight.CoalescingTextAnalyzer(
+            analyzer, model, flights, variant
+        )
+    if scoreCache is not None:
+        analyzer = score_cache.CachedTextAnalyzer(analyzer, model, scoreCache, variant)
+    # chunks of long texts are cached and coalesced individually
+    analyzer = chunking.ChunkedTextAnalyzer(analyzer)
+    return metrics.InstrumentedTextAnalyzer(analyzer, model)
+
+
+modelsDict = registry.ModelRegistry(
+    {
+        tl.ModelType.polarity_openai_gpt3_5_v1: lambda: models.PolarityOpenAIGPT35V1(
+            *clients.openai_clients()
+        ),
+        tl.ModelType.objectivity_openai_gpt3_5_v1: lambda: (
+            models.ObjectivityOpenAIGPT35V1(*clients.openai_clients())
+        ),
+        tl.ModelType.bias_openai_gpt3_5_v0: lambda: models.BiasOpenAIGPT35V0(
+            *clients.openai_clients()
+        ),
+        tl.ModelType.bias_openai_gpt3_5_v1: lambda: models.BiasOpenAIGPT35V1(
+            *clients.openai_clients()
+        ),
+        tl.ModelType.bias_openai_gpt3_5_v2: lambda: models.BiasOpenAIGPT35V2(
+            *clients.openai_clients()
+        ),
+        tl.ModelType.trustlevel_openai_gpt3_5_v1: lambda: (
+            models.TrustLevelOpenAIGPT35V1(*clients.openai_clients())
+        ),
+        tl.ModelType.trustlevel_openai_gpt3_5_v2: lambda: (
+            models.TrustLevelOpenAIGPT35V2(*clients.openai_clients())
+        ),
+        tl.ModelType.bias_openai_gpt4_v1: lambda: models.BiasOpenAIGPT4FewShotV1(
+            *clients.openai_clients()
+        ),
+        tl.ModelType.bias_d4data: lambda: models.BiasD4Data(
+            clients.service_client(BIASD4DATA_URL)
+        ),
+        tl.ModelType.polarity_spacytextblob: lambda: models.PolaritySpacyTextBlob(
+            clients.service_client(SPACYTEXTBLOB_URL)
+        ),
+        tl.ModelType.objectivity_spacytextblob: lambda: models.ObjectivitySpacyTextBlob(
+            clients.service_client(SPACYTEXTBLOB_URL)
+        ),
+        # the stages are the registered models with their cache and instrumentation
+        tl.ModelType.bias_cascade: lambda: models.BiasCascade(modelsDict),
+    },
+    wrap,
+)
+modelsDict.prewarm(model for model in PREWARM_MODELS.split(",") if model)
 
 defaultModel = tl.Model(
     name=tl.ModelType.bias_openai_gpt4_v1,
@@ -75,23 +211,120 @@ defaultModel = tl.Model(
 )
 
 
-@app.post("/trustlevels")
-async def root(request: Request):
-    logging.info(f"Received request: {request.text}")
+async def score(
+    text: str,
+    request_config: tl.Config,
+    limiter: asyncio.Semaphore,
+    deadline: float = None,
+) -> Response:
     config = tl.Config(models=[])
-    if request.config is None:
+    if request_config is None:
         config.models.append(defaultModel)
     else:
-        config = request.config
+        config = request_config
+
+    analyzers = modelsDict
+    if FUSE_MODELS:
+        analyzers = fusion.plan(text, config, modelsDict, clients.async_openai_client())
 
-    result = tl.content_quality_score(request.text, config, modelsDict)
+    with score_cache.track_request() as cache_stats:
+        try:
+            result = await tl.content_quality_score_async(
+                text, config, analyzers, limiter, deadline
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="No model finished in time")
 
-    response = Response(trustlevel=result.score, explanations=result.explanations)
-    if request.config is not None:
-        response.metadata = Metadata(config=config, scores=result.scores)
+    if rawScores is not None:
+        rawScores.add(score_cache.text_hash(text), config, result)
 
+    with metrics.span("response", metrics.RESPONSE_LATENCY):
+        response = Response(trustlevel=result.score, explanations=result.explanations)
+        if request_config is not None:
+            response.metadata = Metadata(
+                config=config, scores=result.scores, cache=cache_stats
+            )
+
+    return response
+
+
+@app.post("/trustlevels")
+async def root(request: Request, http_response: FastAPIResponse):
+    logger.info("Received request: %s", structured_logging.preview(request.text))
+    limiter = asyncio.Semaphore(MODEL_CONCURRENCY) if MODEL_CONCURRENCY > 0 else None
+    deadline = request.deadline or REQUEST_DEADLINE_SECONDS or None
+    with metrics.track_request() as timings:
+        response = await score(request.text, request.config, limiter, deadline)
+    http_response.headers["Server-Timing"] = metrics.server_timing(timings)
     return response
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Model latencies, token usage and cost of this process in Prometheus format"""
+    return FastAPIResponse(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.post("/trustlevels/batch")
+async def root_batch(request: BatchRequest):
+    logger.info("Received batch request with %d items", len(request.items))
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items"
+        )
+
+    # shared by all items so the cap holds across items and models
+    limiter = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    def key(item: BatchItem):
+        config = item.config.model_dump_json() if item.config else None
+        return score_cache.text_hash(item.text), config
+
+    async def lines():
+        async for items, result in batch.score_batch(
+            request.items, lambda item: score(item.text, item.config, limiter), key
+        ):
+            if isinstance(result, Exception):
+                logger.error("Failed to score batch item", exc_info=result)
+                line = {"error": str(result)}
+            else:
+                line = result.model_dump(mode="json")
+            for item in items:
+                yield json.dumps({"id": item.id, **line}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/trustlevels/rescore")
+async def root_rescore(request: RescoreRequest) -> RescoreResponse:
+    """Score stored texts with many configs from their raw scores, without models"""
+    if rawScores is None:
+        raise HTTPException(status_code=404, detail="Raw score store is disabled")
+
+    text_hashes = request.text_hashes
+    if request.texts is not None:
+        text_hashes = (text_hashes or []) + [
+            score_cache.text_hash(text) for text in request.texts
+        ]
+
+    def compute():
+        hashes, columns, raw = rawScores.matrix(text_hashes)
+        trustlevels = rescore.rescore(raw, columns, request.configs)
+        rows = [
+            [None if math.isnan(v) else v for v in row] for row in trustlevels.tolist()
+        ]
+        return RescoreResponse(text_hashes=hashes, trustlevels=rows)
+
+    return await asyncio.to_thread(compute)
+
+
 # This is the entry point for AWS Lambda
-handler = Mangum(app, lifespan="off", api_gateway_base_path="/v1")
+mangum = Mangum(app, lifespan="off", api_gateway_base_path="/v1")
+
+
+def handler(event, context):
+    try:
+        return mangum(event, context)
+    finally:
+        # the Lambda freezes the process after the response, including the log thread
+        structured_logging.flush()
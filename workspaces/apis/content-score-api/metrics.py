@@ -0,0 +1,186 @@
+import json
+import os
+import time
+
+import httpx
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram
+from typing import Any, Dict, Iterator, List, Tuple
+
+import trustlevel as tl
+
+# USD per 1K (prompt, completion) tokens by OpenAI model name prefix
+MODEL_PRICES = json.loads(
+    os.getenv(
+        "MODEL_PRICES",
+        '{"gpt-4-turbo": [0.01, 0.03], "gpt-4": [0.03, 0.06], '
+        '"gpt-3.5-turbo": [0.0005, 0.0015]}',
+    )
+)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+MODEL_LATENCY = Histogram(
+    "trustlevel_model_latency_seconds",
+    "Time to analyze a text per model",
+    ["model"],
+    buckets=LATENCY_BUCKETS,
+)
+MODEL_ERRORS = Counter(
+    "trustlevel_model_errors_total", "Failed analyzer calls per model", ["model"]
+)
+MODEL_TOKENS = Counter(
+    "trustlevel_model_tokens_total",
+    "OpenAI tokens used per model",
+    ["model", "kind"],
+)
+MODEL_COST = Counter(
+    "trustlevel_model_cost_usd_total", "Estimated OpenAI cost per model", ["model"]
+)
+VALIDATION_LATENCY = Histogram(
+    "trustlevel_model_validation_seconds",
+    "Time to validate the TextAnalyzerResponse per model",
+    ["model"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05),
+)
+RESPONSE_LATENCY = Histogram(
+    "trustlevel_response_build_seconds",
+    "Time to build the pydantic response",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05),
+)
+
+# the model on whose behalf OpenAI is called, to attribute the token usage
+_usage_label: ContextVar[str] = ContextVar("usage_label", default="unknown")
+_request_timings: ContextVar[List[Tuple[str, float]]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+@contextmanager
+def track_request() -> Iterator[List[Tuple[str, float]]]:
+    """Collect the (name, seconds) spans of the current request"""
+    timings = []
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+@contextmanager
+def attribute(label: str) -> Iterator[None]:
+    """Count the OpenAI token usage inside the block for the given model label"""
+    token = _usage_label.set(label)
+    try:
+        yield
+    finally:
+        _usage_label.reset(token)
+
+
+@contextmanager
+def span(name: str, histogram=None) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        if histogram is not None:
+            histogram.observe(duration)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, duration))
+
+
+def server_timing(timings: List[Tuple[str, float]]) -> str:
+    """Format spans as Server-Timing header value"""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+
+def total_tokens() -> float:
+    """OpenAI tokens used by this process so far"""
+    return sum(
+        sample.value
+        for metric in MODEL_TOKENS.collect()
+        for sample in metric.samples
+        if sample.name.endswith("_total")
+    )
+
+
+def price(openai_model: str) -> Tuple[float, float]:
+    prefixes = [prefix for prefix in MODEL_PRICES if openai_model.startswith(prefix)]
+    if not prefixes:
+        return 0.0, 0.0
+    return tuple(MODEL_PRICES[max(prefixes, key=len)])
+
+
+def _record_usage(response: httpx.Response) -> None:
+    if response.status_code != 200 or not response.url.path.endswith("completions"):
+        return
+    try:
+        body = response.json()
+        usage = body["usage"]
+    except (ValueError, KeyError):
+        return
+    label = _usage_label.get()
+    prompt_price, completion_price = price(body.get("model", ""))
+    MODEL_TOKENS.labels(label, "prompt").inc(usage["prompt_tokens"])
+    MODEL_TOKENS.labels(label, "completion").inc(usage["completion_tokens"])
+    MODEL_COST.labels(label).inc(
+        (
+            usage["prompt_tokens"] * prompt_price
+            + usage["completion_tokens"] * completion_price
+        )
+        / 1000
+    )
+
+
+def record_usage(response: httpx.Response) -> None:
+    """httpx response hook recording the token usage of OpenAI responses"""
+    response.read()
+    _record_usage(response)
+
+
+async def record_usage_async(response: httpx.Response) -> None:
+    """httpx response hook recording the token usage of OpenAI responses"""
+    await response.aread()
+    _record_usage(response)
+
+
+class InstrumentedTextAnalyzer:
+    """InstrumentedTextAnalyzer times every analyzer call and its validation.
+
+    It also makes the model known to the OpenAI response hooks, so the token usage
+    is counted per model.
+    """
+
+    def __init__(self, analyzer: tl.TextAnalyzer, model: tl.ModelType):
+        self.__analyzer = analyzer
+        self.__model = model
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Any:
+        with attribute(self.__model.value), self.__span():
+            result = self.__analyzer.analyze_text(text, config)
+        return self.__validate(result)
+
+    async def analyze_text_async(self, text: str, config: Dict[str, Any]) -> Any:
+        with attribute(self.__model.value), self.__span():
+            result = await tl.analyze_text_async(self.__analyzer, text, config)
+        return self.__validate(result)
+
+    @contextmanager
+    def __span(self) -> Iterator[None]:
+        try:
+            with span(self.__model.name, MODEL_LATENCY.labels(self.__model.value)):
+                yield
+        except Exception:
+            MODEL_ERRORS.labels(self.__model.value).inc()
+            raise
+
+    def __validate(self, result: Any) -> tl.TextAnalyzerResponse:
+        with span(
+            f"validate_{self.__model.name}",
+            VALIDATION_LATENCY.labels(self.__model.value),
+        ):
+            return tl.TextAnalyzerResponse.model_validate(result)
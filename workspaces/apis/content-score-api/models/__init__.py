@@ -1,8 +1,26 @@
-from .bias_openai_gpt3_5_v0 import BiasOpenAIGPT35V0  # noqa: F401
-from .bias_openai_gpt3_5_v1 import BiasOpenAIGPT35V1  # noqa: F401
-from .bias_openai_gpt3_5_v2 import BiasOpenAIGPT35V2  # noqa: F401
-from .bias_openai_gpt4_few_shot_v1 import BiasOpenAIGPT4FewShotV1  # noqa: F401
-from .objectivity_openai_gpt3_5_v1 import ObjectivityOpenAIGPT35V1  # noqa: F401
-from .polarity_openai_gpt3_5_v1 import PolarityOpenAIGPT35V1  # noqa: F401
-from .trustlevel_openai_gpt3_5_v1 import TrustLevelOpenAIGPT35V1  # noqa: F401
-from .trustlevel_openai_gpt3_5_v2 import TrustLevelOpenAIGPT35V2  # noqa: F401
+import importlib
+
+# models are imported on first use, importing langchain for all of them up
+# front slows down cold starts
+_MODULES = {
+    "BiasCascade": ".bias_cascade",
+    "BiasD4Data": ".bias_d4data",
+    "BiasOpenAIGPT35V0": ".bias_openai_gpt3_5_v0",
+    "BiasOpenAIGPT35V1": ".bias_openai_gpt3_5_v1",
+    "BiasOpenAIGPT35V2": ".bias_openai_gpt3_5_v2",
+    "BiasOpenAIGPT4FewShotV1": ".bias_openai_gpt4_few_shot_v1",
+    "ObjectivityOpenAIGPT35V1": ".objectivity_openai_gpt3_5_v1",
+    "ObjectivitySpacyTextBlob": ".objectivity_spacytextblob",
+    "PolarityOpenAIGPT35V1": ".polarity_openai_gpt3_5_v1",
+    "PolaritySpacyTextBlob": ".polarity_spacytextblob",
+    "TrustLevelOpenAIGPT35V1": ".trustlevel_openai_gpt3_5_v1",
+    "TrustLevelOpenAIGPT35V2": ".trustlevel_openai_gpt3_5_v2",
+}
+
+__all__ = list(_MODULES)
+
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        return getattr(importlib.import_module(_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
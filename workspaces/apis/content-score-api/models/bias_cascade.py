@@ -0,0 +1,129 @@
+import logging
+from typing import Any, Dict, List, Mapping, Tuple
+
+from pydantic import BaseModel
+
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeStage(BaseModel):
+    model: tl.ModelType
+    # the stage decides if the absolute score reaches the threshold, required for
+    # every stage but the last, which always decides
+    threshold: float = None
+    config: Dict[str, Any] = None
+
+
+class CascadeConfig(BaseModel):
+    # the absolute d4data score of a single chunk text is the probability of the top
+    # label, which is never below 0.5, so only texts with a clear label decide
+    stages: List[CascadeStage] = [
+        CascadeStage(model=tl.ModelType.bias_d4data, threshold=0.8),
+        CascadeStage(model=tl.ModelType.bias_openai_gpt4_v1),
+    ]
+
+
+class BiasCascade:
+    """BiasCascade scores a text with cheap models first and escalates uncertain texts.
+
+    A stage is certain if its score is outside (-threshold, threshold): scores close
+    to 0.0 are neither clearly biased nor clearly unbiased. Only uncertain texts are
+    passed on to the next, usually slower and more expensive, stage.
+    """
+
+    def __init__(self, models: Mapping[tl.ModelType, tl.TextAnalyzer]):
+        self.__models = models
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        stages = self.__stages(config)
+        ran = []
+        for index, stage in enumerate(stages):
+            try:
+                analyzer = self.__models[stage.model]
+                result = analyzer.analyze_text(text, stage.config)
+                result = tl.TextAnalyzerResponse.model_validate(result)
+            except Exception as e:
+                self.__escalate(stages, index, e)
+                ran.append((index, stage, e))
+                continue
+            ran.append((index, stage, result))
+            if self.__decides(stage, result):
+                break
+        return self.__result(ran)
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        stages = self.__stages(config)
+        ran = []
+        for index, stage in enumerate(stages):
+            try:
+                analyzer = self.__models[stage.model]
+                result = await tl.analyze_text_async(analyzer, text, stage.config)
+                result = tl.TextAnalyzerResponse.model_validate(result)
+            except Exception as e:
+                self.__escalate(stages, index, e)
+                ran.append((index, stage, e))
+                continue
+            ran.append((index, stage, result))
+            if self.__decides(stage, result):
+                break
+        return self.__result(ran)
+
+    def __stages(self, config: Dict[str, Any]) -> List[CascadeStage]:
+        stages = CascadeConfig.model_validate(config or {}).stages
+        if not stages:
+            raise ValueError("A cascade needs at least one stage")
+        for index, stage in enumerate(stages):
+            if stage.model == tl.ModelType.bias_cascade:
+                raise ValueError("A cascade cannot contain itself")
+            if stage.model not in self.__models:
+                raise ValueError(f"Unknown model {stage.model}")
+            if stage.threshold is None and index < len(stages) - 1:
+                raise ValueError(
+                    f"Stage {index} ({stage.model.value}) needs a threshold, "
+                    "only the last stage always decides"
+                )
+        return stages
+
+    def __escalate(
+        self, stages: List[CascadeStage], index: int, error: Exception
+    ) -> None:
+        """Pass the text on to the next stage if a stage failed, unless it was the last"""
+        if index == len(stages) - 1:
+            raise error
+        logger.warning(
+            "stage %d (%s) failed, escalating to the next stage",
+            index,
+            stages[index].model.value,
+            exc_info=error,
+        )
+
+    def __decides(self, stage: CascadeStage, result: tl.TextAnalyzerResponse) -> bool:
+        return stage.threshold is None or abs(result.score) >= stage.threshold
+
+    def __result(self, ran: List[Tuple[int, CascadeStage, Any]]) -> Dict[str, Any]:
+        # the last stage that ran decided, failed stages are always escalated
+        decided, stage, result = ran[-1]
+        logger.info(
+            "stage %d (%s) decided with score %s",
+            decided,
+            stage.model.value,
+            result.score,
+        )
+        return {
+            "score": result.score,
+            "details": {
+                "decided_by": {"stage": decided, "model": stage.model},
+                "stages": [
+                    {"model": stage.model, "error": str(outcome)}
+                    if isinstance(outcome, Exception)
+                    else {"model": stage.model, "score": outcome.score}
+                    for _, stage, outcome in ran
+                ],
+                "details": result.details,
+            },
+            "explanations": result.explanations,
+        }
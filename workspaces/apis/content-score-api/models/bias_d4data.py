@@ -0,0 +1,37 @@
+import logging
+from typing import Dict, Any
+
+from clients import ServiceClient
+
+logger = logging.getLogger(__name__)
+
+
+class BiasD4Data:
+    """BiasD4Data determines the bias score of a text with the self-hosted d4data model."""
+
+    __service: ServiceClient
+
+    def __init__(self, service: ServiceClient):
+        self.__service = service
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        return self.__result(self.__service.analyze(text))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return self.__result(await self.__service.analyze_async(text))
+
+    def __result(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("response: %s", response, extra={"payload": True})
+
+        # map to [-1.0, 1.0] where -1.0 is most biased and 1.0 is least biased
+        score = response["score"]
+        if response["label"] == "Biased":
+            score = -score
+
+        return {
+            "score": score,
+            "details": response,
+            "explanations": [],
+        }
@@ -1,7 +1,7 @@
 import json
 import logging
 from typing import Dict, Any
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 
 logger = logging.getLogger(__name__)
@@ -11,25 +11,40 @@ class BiasOpenAIGPT35V0:
     """BiasOpenAIGPT35V0 determines the bias score of a text using simple prompting."""
 
     __client: OpenAI
+    __async_client: AsyncOpenAI
 
-    def __init__(self, client: OpenAI):
+    def __init__(self, client: OpenAI, async_client: AsyncOpenAI):
         self.__client = client
+        self.__async_client = async_client
 
     def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        response = self.__client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = self.__client.chat.completions.create(**self.__request(text))
+        return self.__parse(response)
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        response = await self.__async_client.chat.completions.create(
+            **self.__request(text)
+        )
+        return self.__parse(response)
+
+    def __request(self, text: str) -> Dict[str, Any]:
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": [
                 {
                     "role": "system",
                     "content": 'You will be provided with text delimited by triple quotes for which you determine the bias score ("bias_score") in the range [-1.0,1.0] where 1.0 means not biased and -1.0 means the text is very biased. You reply with a single pure JSON object only (no markdown or anything else), with the field "bias_score". Explain step by step how you came up with the score in an additional JSON object field called "chain_of_thought" but do not summarize the text.',
                 },
                 {"role": "user", "content": f'"""{text}"""'},
             ],
-        )
+        }
 
+    def __parse(self, response) -> Dict[str, Any]:
         # parse the json response
         response_json = response.choices[0].message.content
-        logger.info("response_json: %s", response_json)
+        logger.debug("response_json: %s", response_json, extra={"payload": True})
 
         response_dict = json.loads(response_json)
         bias_score = response_dict["bias_score"]
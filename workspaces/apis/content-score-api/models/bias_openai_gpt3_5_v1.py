@@ -6,6 +6,7 @@ from langchain.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field, validator
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +30,12 @@ class BiasResponse(BaseModel):
 
 
 class BiasOpenAIGPT35V1:
-    def __init__(self):
-        model = ChatOpenAI(temperature=0)
+    def __init__(self, client: OpenAI, async_client: AsyncOpenAI):
+        model = ChatOpenAI(
+            temperature=0,
+            client=client.chat.completions,
+            async_client=async_client.chat.completions,
+        )
         parser = JsonOutputParser(pydantic_object=BiasResponse)
         prompt = PromptTemplate(
             template="You will be provided with text delimited by triple quotes for which you determine the bias score.\n{format_instructions}\n{input}\n",
@@ -41,9 +46,15 @@ class BiasOpenAIGPT35V1:
         self.__chain = prompt | model | parser
 
     def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        response = self.__chain.invoke({"input": text})
+        return self.__parse(self.__chain.invoke({"input": text}))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return self.__parse(await self.__chain.ainvoke({"input": text}))
 
-        logger.info("response: %s", response)
+    def __parse(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("response: %s", response, extra={"payload": True})
         logger.warning("this model does not yet support explanations")
         return {
             "score": response["bias_score"],
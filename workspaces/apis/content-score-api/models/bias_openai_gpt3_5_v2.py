@@ -5,6 +5,7 @@ from langchain_core.utils.function_calling import convert_to_openai_function
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field, validator
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
 from langchain.output_parsers.openai_functions import PydanticOutputFunctionsParser
 
 
@@ -30,8 +31,15 @@ class BiasResponse(BaseModel):
 
 
 class BiasOpenAIGPT35V2:
-    def __init__(self):
-        model = ChatOpenAI(temperature=0)
+    # lets fusion.py score this model together with others in a single call
+    fusion_model = "gpt-3.5-turbo"
+
+    def __init__(self, client: OpenAI, async_client: AsyncOpenAI):
+        model = ChatOpenAI(
+            temperature=0,
+            client=client.chat.completions,
+            async_client=async_client.chat.completions,
+        )
 
         prompt = ChatPromptTemplate.from_messages(
             [
@@ -46,12 +54,22 @@ class BiasOpenAIGPT35V2:
         parser = PydanticOutputFunctionsParser(pydantic_schema=BiasResponse)
 
         openai_functions = [convert_to_openai_function(BiasResponse)]
+        self.fusion_schema = openai_functions[0]["parameters"]
         self.chain = prompt | model.bind(functions=openai_functions) | parser
 
     def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        result: BiasResponse = self.chain.invoke({"input": f'"""{text}"""'})
+        return self.__parse(self.chain.invoke({"input": f'"""{text}"""'}))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return self.__parse(await self.chain.ainvoke({"input": f'"""{text}"""'}))
+
+    def from_fused(self, response_dict: Dict[str, Any]) -> Dict[str, Any]:
+        return self.__parse(BiasResponse(**response_dict))
 
-        logger.info("result: %s", result)
+    def __parse(self, result: BiasResponse) -> Dict[str, Any]:
+        logger.debug("result: %s", result, extra={"payload": True})
         logger.warning("this model does not yet support explanations")
         return {
             "score": result.bias_score,
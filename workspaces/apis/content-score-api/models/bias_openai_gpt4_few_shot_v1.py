@@ -3,6 +3,7 @@ import logging
 
 from langchain_core.pydantic_v1 import BaseModel, Field, validator
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
 from langchain.output_parsers.openai_tools import PydanticToolsParser
 from langchain_core.prompts.few_shot import FewShotPromptTemplate
 from langchain_core.prompts.prompt import PromptTemplate
@@ -79,9 +80,14 @@ class BiasOpenAIGPT4FewShotV1:
         },
     ]
 
-    def __init__(self):
+    def __init__(self, client: OpenAI, async_client: AsyncOpenAI):
         tools = [BiasScore]
-        model = ChatOpenAI(temperature=0, model="gpt-4-turbo").bind_tools(tools)
+        model = ChatOpenAI(
+            temperature=0,
+            model="gpt-4-turbo",
+            client=client.chat.completions,
+            async_client=async_client.chat.completions,
+        ).bind_tools(tools)
 
         example_prompt = PromptTemplate(
             input_variables=["rating", "article", "explanation"],
@@ -100,10 +106,17 @@ class BiasOpenAIGPT4FewShotV1:
         self.chain = prompt | model | parser
 
     def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        logger.info("perform analysis")
-        result: BiasScore = self.chain.invoke({"input": f'"""{text}"""'})
+        logger.debug("perform analysis")
+        return self.__parse(self.chain.invoke({"input": f'"""{text}"""'}))
 
-        logger.info("result: %s", result)
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        logger.debug("perform analysis")
+        return self.__parse(await self.chain.ainvoke({"input": f'"""{text}"""'}))
+
+    def __parse(self, result: List[BiasScore]) -> Dict[str, Any]:
+        logger.debug("result: %s", result, extra={"payload": True})
 
         return {
             "score": 2 * result[0].bias - 1,
@@ -2,7 +2,7 @@ import json
 import logging
 
 from typing import Dict, Any
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -11,27 +11,64 @@ class ObjectivityOpenAIGPT35V1:
     """ObjectivityOpenAIGPT35V1 determines the objectivity score of a text using simple prompting."""
 
     __client: OpenAI
+    __async_client: AsyncOpenAI
 
-    def __init__(self, client: OpenAI):
+    # lets fusion.py score this model together with others in a single call
+    fusion_model = "gpt-3.5-turbo"
+    fusion_schema = {
+        "type": "object",
+        "properties": {
+            "objectivity": {
+                "type": "number",
+                "description": "objectivity score in the range [-1.0,1.0] where 1.0 means very objective and -1.0 means the text is very subjective",
+            },
+            "chain_of_thought": {
+                "type": "string",
+                "description": "Explain step by step how you came up with the score but do not summarize the text",
+            },
+        },
+        "required": ["objectivity", "chain_of_thought"],
+    }
+
+    def __init__(self, client: OpenAI, async_client: AsyncOpenAI):
         self.__client = client
+        self.__async_client = async_client
 
     def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        response = self.__client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = self.__client.chat.completions.create(**self.__request(text))
+        return self.__parse(response)
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        response = await self.__async_client.chat.completions.create(
+            **self.__request(text)
+        )
+        return self.__parse(response)
+
+    def __request(self, text: str) -> Dict[str, Any]:
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": [
                 {
                     "role": "system",
                     "content": 'You will be provided with text delimited by triple quotes for which you determine the subjectivity and objectivity score ("objectivity") in the range [-1.0,1.0] where 1.0 means very objective and -1.0 means the text is very subjective. You reply with a single pure JSON object only (no markdown or anything else), with the field "objectivity". Explain step by step how you came up with the score in an additional JSON object field called "chain_of_thought" but do not summarize the text.',
                 },
                 {"role": "user", "content": f'"""{text}"""'},
             ],
-        )
+        }
 
+    def __parse(self, response) -> Dict[str, Any]:
         # parse the json response
         response_json = response.choices[0].message.content
-        logger.info("response_json: %s", response_json)
+        logger.debug("response_json: %s", response_json, extra={"payload": True})
+
+        return self.__result(json.loads(response_json))
+
+    def from_fused(self, response_dict: Dict[str, Any]) -> Dict[str, Any]:
+        return self.__result(response_dict)
 
-        response_dict = json.loads(response_json)
+    def __result(self, response_dict: Dict[str, Any]) -> Dict[str, Any]:
         objectivity = response_dict["objectivity"]
 
         logger.warning("this model does not yet support explanations")
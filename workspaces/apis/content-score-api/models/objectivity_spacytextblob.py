@@ -0,0 +1,38 @@
+import logging
+from typing import Dict, Any
+
+from clients import ServiceClient
+
+logger = logging.getLogger(__name__)
+
+
+class ObjectivitySpacyTextBlob:
+    """ObjectivitySpacyTextBlob determines the objectivity score of a text with the self-hosted spacytextblob service."""
+
+    __service: ServiceClient
+
+    def __init__(self, service: ServiceClient):
+        self.__service = service
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        return self.__result(self.__service.analyze(text))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return self.__result(await self.__service.analyze_async(text))
+
+    def __result(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info(
+            "polarity: %s subjectivity: %s",
+            response["polarity"],
+            response["subjectivity"],
+        )
+
+        # textblob subjectivity is in [0.0, 1.0] where 1.0 is very subjective, map it
+        # to [-1.0, 1.0] where 1.0 is very objective like the other objectivity models
+        return {
+            "score": 1.0 - 2.0 * response["subjectivity"],
+            "details": response,
+            "explanations": [],
+        }
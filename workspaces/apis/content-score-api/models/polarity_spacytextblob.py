@@ -0,0 +1,37 @@
+import logging
+from typing import Dict, Any
+
+from clients import ServiceClient
+
+logger = logging.getLogger(__name__)
+
+
+class PolaritySpacyTextBlob:
+    """PolaritySpacyTextBlob determines the polarity score of a text with the self-hosted spacytextblob service."""
+
+    __service: ServiceClient
+
+    def __init__(self, service: ServiceClient):
+        self.__service = service
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        return self.__result(self.__service.analyze(text))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return self.__result(await self.__service.analyze_async(text))
+
+    def __result(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info(
+            "polarity: %s subjectivity: %s",
+            response["polarity"],
+            response["subjectivity"],
+        )
+
+        # textblob polarity is already in [-1.0, 1.0] from very negative to very positive
+        return {
+            "score": response["polarity"],
+            "details": response,
+            "explanations": [],
+        }
@@ -7,6 +7,7 @@ from langchain_core.utils.function_calling import (
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field, validator
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI, OpenAI
 from langchain.output_parsers.openai_functions import PydanticOutputFunctionsParser
 
 logger = logging.getLogger(__name__)
@@ -171,8 +172,12 @@ class TrustLevelOpenAIGPT35V2:
         },
     }
 
-    def __init__(self):
-        model = ChatOpenAI(temperature=0)
+    def __init__(self, client: OpenAI, async_client: AsyncOpenAI):
+        model = ChatOpenAI(
+            temperature=0,
+            client=client.chat.completions,
+            async_client=async_client.chat.completions,
+        )
 
         prompt = ChatPromptTemplate.from_messages(
             [
@@ -190,10 +195,23 @@ class TrustLevelOpenAIGPT35V2:
         self.chain = prompt | model.bind(functions=openai_functions) | parser
 
     def analyze_text(self, text: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        logger.info("prompts: %s", self.chain.get_prompts())
-        result: TrustLevelV2Response = self.chain.invoke({"input": f'"""{text}"""'})
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "prompts: %s", self.chain.get_prompts(), extra={"payload": True}
+            )
+        return self.__parse(self.chain.invoke({"input": f'"""{text}"""'}))
+
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "prompts: %s", self.chain.get_prompts(), extra={"payload": True}
+            )
+        return self.__parse(await self.chain.ainvoke({"input": f'"""{text}"""'}))
 
-        logger.info("result: %s", result)
+    def __parse(self, result: TrustLevelV2Response) -> Dict[str, Any]:
+        logger.debug("result: %s", result, extra={"payload": True})
         objectivity_score = (
             (
                 result.objectivity_score.emotional_language
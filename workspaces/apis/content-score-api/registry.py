@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator
+
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry(Mapping):
+    """ModelRegistry constructs an analyzer the first time its ModelType is requested.
+
+    Building the LangChain chains and OpenAI clients of every model at import time
+    slows down cold starts although most requests only use a single model.
+    """
+
+    def __init__(
+        self,
+        factories: Dict[tl.ModelType, Callable[[], tl.TextAnalyzer]],
+        wrap: Callable[..., tl.TextAnalyzer] = None,
+    ):
+        self.__factories = factories
+        self.__wrap = wrap
+        self.__models: Dict[tl.ModelType, tl.TextAnalyzer] = {}
+        self.__analyzers: Dict[tl.ModelType, tl.TextAnalyzer] = {}
+        self.__lock = threading.Lock()
+        self.__model_lock = threading.Lock()
+        # seconds it took to import and construct each loaded model
+        self.load_times: Dict[tl.ModelType, float] = {}
+
+    def __getitem__(self, model: tl.ModelType) -> tl.TextAnalyzer:
+        analyzer = self.__analyzers.get(model)
+        if analyzer is not None:
+            return analyzer
+
+        with self.__lock:
+            if model not in self.__analyzers:
+                self.__analyzers[model] = self.wrap(model, self.unwrapped(model))
+            return self.__analyzers[model]
+
+    def unwrapped(self, model: tl.ModelType) -> tl.TextAnalyzer:
+        """The model itself, without caching or any other wrapper"""
+        analyzer = self.__models.get(model)
+        if analyzer is not None:
+            return analyzer
+
+        with self.__model_lock:
+            if model not in self.__models:
+                factory = self.__factories[model]
+                start = time.perf_counter()
+                self.__models[model] = factory()
+                self.load_times[model] = time.perf_counter() - start
+                logger.info(
+                    "Loaded model %s in %.3fs", model.value, self.load_times[model]
+                )
+            return self.__models[model]
+
+    def wrap(
+        self, model: tl.ModelType, analyzer: tl.TextAnalyzer, variant: str = ""
+    ) -> tl.TextAnalyzer:
+        """Apply the registry wrappers to an analyzer of the given model.
+
+        Results of a variant (e.g. "fused") are cached apart from the model run alone.
+        """
+        if self.__wrap is None:
+            return analyzer
+        return self.__wrap(model, analyzer, variant)
+
+    def __contains__(self, model: object) -> bool:
+        return model in self.__factories
+
+    def __iter__(self) -> Iterator[tl.ModelType]:
+        return iter(self.__factories)
+
+    def __len__(self) -> int:
+        return len(self.__factories)
+
+    def prewarm(self, models: Iterable[str]) -> None:
+        """Load the given models up front, e.g. during the Lambda init phase"""
+        for model in models:
+            self[tl.ModelType(model)]
@@ -0,0 +1,256 @@
+"""
+Re-score texts from stored raw model scores without calling any model.
+
+The trustlevel only depends on the raw score of every model, its activation and its
+weight, so candidate activations and weights can be evaluated on an already scored
+corpus in one vectorized pass.
+
+Usage: python rescore.py --store raw-scores.sqlite3 --configs configs.jsonl
+       [--grid grid.json] [--text-hashes hashes.txt] [--output trustlevels.csv]
+
+A grid file expands a base config along parameter axes, e.g.
+{"base": {"models": [...]}, "axes": {"bias/openai/gpt-4-v1.steepness": [2, 5, 8]}}
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+# (model, model config key) of a raw score column
+Column = Tuple[str, str]
+
+# maximum number of (text, config, model) elements evaluated at once
+BLOCK_ELEMENTS = 2**22
+
+
+def config_key(config: Optional[Dict[str, Any]]) -> str:
+    """Stable key of a per-model config (TrustLevelConfig.model)"""
+    return json.dumps(config, sort_keys=True, default=str) if config else ""
+
+
+class RawScoreStore:
+    """RawScoreStore persists the raw score of every scored (text, model, config).
+
+    Unlike the score cache entries never expire, the store is the input of re-scoring
+    sweeps over an evaluation corpus.
+    """
+
+    def __init__(self, path: str):
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS raw_scores ("
+            "text_hash TEXT NOT NULL, model TEXT NOT NULL, config TEXT NOT NULL, "
+            "raw REAL NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (text_hash, model, config))"
+        )
+        self.__connection.commit()
+
+    def add(self, text_hash: str, config: tl.Config, result: tl.ContentQuality):
+        """Store the raw scores of a content_quality_score result"""
+        now = time.time()
+        rows = [
+            (
+                text_hash,
+                model.name.value,
+                config_key(model.config.model),
+                result.scores[model.name]["raw"],
+                now,
+            )
+            for model in config.models
+            # missing models and fallback answers have no raw score of the model
+            if result.scores[model.name]["raw"] is not None
+            and "fallback" not in result.scores[model.name]
+        ]
+        try:
+            with self.__lock, self.__connection:
+                self.__connection.executemany(
+                    "INSERT OR REPLACE INTO raw_scores VALUES (?, ?, ?, ?, ?)", rows
+                )
+        except sqlite3.Error:
+            logger.warning("failed to write raw scores", exc_info=True)
+
+    def matrix(
+        self, text_hashes: Iterable[str] = None
+    ) -> Tuple[List[str], List[Column], np.ndarray]:
+        """
+        Load the stored raw scores as a dense matrix.
+
+        Args:
+            text_hashes (Iterable[str]): The texts to load, all stored texts if None.
+
+        Returns:
+            Tuple[List[str], List[Column], np.ndarray]: The text hashes (rows), the
+            (model, config key) columns and the raw scores, NaN where a text was not
+            scored by a column.
+
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                "SELECT text_hash, model, config, raw FROM raw_scores"
+            ).fetchall()
+
+        if text_hashes is None:
+            text_hashes = sorted({row[0] for row in rows})
+        else:
+            text_hashes = list(text_hashes)
+        row_index = {text_hash: i for i, text_hash in enumerate(text_hashes)}
+        columns = sorted({(row[1], row[2]) for row in rows})
+        column_index = {column: j for j, column in enumerate(columns)}
+
+        raw = np.full((len(text_hashes), len(columns)), np.nan)
+        for text_hash, model, config, value in rows:
+            i = row_index.get(text_hash)
+            if i is not None:
+                raw[i, column_index[(model, config)]] = value
+        return text_hashes, columns, raw
+
+
+def rescore(
+    raw: np.ndarray, columns: List[Column], configs: List[tl.Config]
+) -> np.ndarray:
+    """
+    Compute the trustlevel of every text for every config.
+
+    Args:
+        raw (np.ndarray): The raw scores, one row per text and one column per
+            (model, config key).
+        columns (List[Column]): The (model, config key) of every raw score column.
+        configs (List[Config]): The candidate configs.
+
+    Returns:
+        np.ndarray: The trustlevels, one row per text and one column per config, NaN
+        where a model of the config has no raw score for the text.
+
+    """
+    column_index = {column: j for j, column in enumerate(columns)}
+    # a trailing NaN column stands in for models that were never scored
+    raw = np.concatenate([raw, np.full((raw.shape[0], 1), np.nan)], axis=1)
+    missing = raw.shape[1] - 1
+
+    width = max((len(config.models) for config in configs), default=0)
+    index = np.full((len(configs), width), missing)
+    mask = np.zeros((len(configs), width), dtype=bool)
+    weight, scaling, steepness, shift = np.zeros((4, len(configs), width))
+    for k, config in enumerate(configs):
+        for m, model in enumerate(config.models):
+            column = (model.name.value, config_key(model.config.model))
+            index[k, m] = column_index.get(column, missing)
+            mask[k, m] = True
+            weight[k, m] = model.config.weight
+            scaling[k, m] = model.config.activation.scaling
+            steepness[k, m] = model.config.activation.steepness
+            shift[k, m] = model.config.activation.shift
+
+    result = np.empty((raw.shape[0], len(configs)))
+    block = max(BLOCK_ELEMENTS // max(raw.shape[0] * width, 1), 1)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(configs), block):
+            k = slice(start, start + block)
+            x = raw[:, index[k]]
+            scaled = scaling[k] / (1.0 + np.exp(-steepness[k] * (x - shift[k])))
+            result[:, k] = np.where(mask[k], weight[k] * scaled, 0.0).sum(axis=-1)
+    return result
+
+
+def expand_grid(base: tl.Config, axes: Dict[str, List[float]]) -> List[tl.Config]:
+    """
+    Build a config for every combination of parameter values.
+
+    Args:
+        base (Config): The config the parameters are applied to.
+        axes (Dict[str, List[float]]): Values by `<model name>.<parameter>`, where the
+            parameter is weight, scaling, steepness or shift.
+
+    Returns:
+        List[Config]: The configs in the order of itertools.product over the axes.
+
+    """
+    configs = []
+    for values in itertools.product(*axes.values()):
+        config = base.model_copy(deep=True)
+        for path, value in zip(axes, values):
+            name, _, parameter = path.rpartition(".")
+            models = [model for model in config.models if model.name.value == name]
+            if not models:
+                raise ValueError(f"Unknown model {name} in grid axis {path}")
+            for model in models:
+                if parameter == "weight":
+                    model.config.weight = value
+                elif parameter in ("scaling", "steepness", "shift"):
+                    setattr(model.config.activation, parameter, value)
+                else:
+                    raise ValueError(f"Unknown parameter {parameter} in {path}")
+        configs.append(config)
+    return configs
+
+
+def read_configs(path: str) -> List[tl.Config]:
+    """Read configs from a JSON array or a JSON lines file"""
+    with open(path) as file:
+        content = file.read().strip()
+    if content.startswith("["):
+        items = json.loads(content)
+    else:
+        items = [json.loads(line) for line in content.splitlines() if line.strip()]
+    return [tl.Config.model_validate(item) for item in items]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--store", required=True, help="raw score store file")
+    parser.add_argument("--configs", help="JSON array or JSON lines of configs")
+    parser.add_argument("--grid", help="JSON file with a base config and axes")
+    parser.add_argument("--text-hashes", help="file with one text hash per line")
+    parser.add_argument("--output", help="CSV file, default: stdout")
+    args = parser.parse_args()
+
+    configs = read_configs(args.configs) if args.configs else []
+    if args.grid:
+        with open(args.grid) as file:
+            grid = json.load(file)
+        configs += expand_grid(tl.Config.model_validate(grid["base"]), grid["axes"])
+    if not configs:
+        parser.error("one of --configs or --grid is required")
+
+    text_hashes = None
+    if args.text_hashes:
+        with open(args.text_hashes) as file:
+            text_hashes = [line.strip() for line in file if line.strip()]
+
+    start = time.perf_counter()
+    text_hashes, columns, raw = RawScoreStore(args.store).matrix(text_hashes)
+    trustlevels = rescore(raw, columns, configs)
+    print(
+        f"Scored {len(text_hashes)} texts with {len(configs)} configs "
+        f"in {time.perf_counter() - start:.3f}s",
+        file=sys.stderr,
+    )
+
+    file = open(args.output, "w", newline="") if args.output else sys.stdout
+    try:
+        writer = csv.writer(file)
+        writer.writerow(["text_hash", *range(len(configs))])
+        for text_hash, row in zip(text_hashes, trustlevels):
+            writer.writerow([text_hash, *("" if np.isnan(v) else v for v in row)])
+    finally:
+        if args.output:
+            file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+import cache
+import trustlevel as tl
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """SingleFlight lets concurrent calls with the same key share one computation.
+
+    The computation runs as its own task: errors are raised to every waiter and a
+    cancelled waiter does not cancel the computation for the others.
+    """
+
+    def __init__(self):
+        self.__flights: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self.__flights.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn())
+            self.__flights[key] = task
+            task.add_done_callback(lambda done: self.__land(key, done))
+        else:
+            logger.info("joining in-flight computation")
+        return await asyncio.shield(task)
+
+    def __land(self, key: Hashable, task: asyncio.Task) -> None:
+        if self.__flights.get(key) is task:
+            del self.__flights[key]
+        if not task.cancelled():
+            # mark the exception as retrieved in case every waiter was cancelled
+            task.exception()
+
+
+class CoalescingTextAnalyzer:
+    """CoalescingTextAnalyzer shares one analyzer call between identical concurrent requests."""
+
+    def __init__(
+        self,
+        analyzer: tl.TextAnalyzer,
+        model: tl.ModelType,
+        flights: SingleFlight,
+        variant: str = "",
+    ):
+        self.__analyzer = analyzer
+        self.__model = model
+        self.__flights = flights
+        self.__variant = variant
+
+    def analyze_text(self, text: str, config: Dict[str, Any]) -> Any:
+        return self.__analyzer.analyze_text(text, config)
+
+    async def analyze_text_async(self, text: str, config: Dict[str, Any]) -> Any:
+        return await self.__flights.do(
+            cache.cache_key(text, self.__model, config, self.__variant),
+            lambda: tl.analyze_text_async(self.__analyzer, text, config),
+        )
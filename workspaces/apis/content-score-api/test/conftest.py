@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the service modules are imported as top-level modules, as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
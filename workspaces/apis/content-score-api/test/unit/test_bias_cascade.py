@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import trustlevel as tl
+from models.bias_cascade import BiasCascade
+from models.bias_d4data import BiasD4Data
+
+
+class D4DataService:
+    """Answers like the d4data service for a text that fits into one chunk"""
+
+    def __init__(self, label, score):
+        self.response = {"label": label, "score": score}
+
+    def analyze(self, text):
+        return self.response
+
+    async def analyze_async(self, text):
+        return self.response
+
+
+class Analyzer:
+    def __init__(self, score=None, error=None):
+        self.score = score
+        self.error = error
+        self.calls = 0
+
+    def analyze_text(self, text, config):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {"score": self.score, "details": {}, "explanations": []}
+
+
+def cascade(d4data, gpt4):
+    return BiasCascade(
+        {tl.ModelType.bias_d4data: d4data, tl.ModelType.bias_openai_gpt4_v1: gpt4}
+    )
+
+
+@pytest.mark.parametrize(
+    "label, score, decided_by",
+    [
+        # top-label probabilities close to 0.5 are uncertain
+        ("Non-biased", 0.55, 1),
+        ("Biased", 0.55, 1),
+        ("Non-biased", 0.95, 0),
+        ("Biased", 0.9, 0),
+    ],
+)
+def test_default_cascade_escalates_uncertain_d4data_scores(label, score, decided_by):
+    gpt4 = Analyzer(score=0.2)
+    result = cascade(BiasD4Data(D4DataService(label, score)), gpt4).analyze_text(
+        "text", None
+    )
+    assert result["details"]["decided_by"]["stage"] == decided_by
+    assert gpt4.calls == decided_by
+
+
+def test_async_cascade_escalates_uncertain_d4data_scores():
+    gpt4 = Analyzer(score=0.2)
+    result = asyncio.run(
+        cascade(BiasD4Data(D4DataService("Non-biased", 0.55)), gpt4).analyze_text_async(
+            "text", None
+        )
+    )
+    assert result["score"] == 0.2
+    assert [stage["score"] for stage in result["details"]["stages"]] == [0.55, 0.2]
+
+
+def test_failed_stage_escalates():
+    result = cascade(
+        Analyzer(error=RuntimeError("down")), Analyzer(score=0.2)
+    ).analyze_text("text", None)
+    assert result["details"]["stages"][0]["error"] == "down"
+    assert result["details"]["decided_by"]["stage"] == 1
+
+
+def test_failed_last_stage_raises():
+    with pytest.raises(RuntimeError):
+        cascade(Analyzer(score=0.1), Analyzer(error=RuntimeError("down"))).analyze_text(
+            "text", None
+        )
+
+
+def test_threshold_required_before_last_stage():
+    config = {"stages": [{"model": "bias/d4data"}, {"model": "bias/openai/gpt-4-v1"}]}
+    with pytest.raises(ValueError):
+        cascade(Analyzer(score=0.9), Analyzer(score=0.2)).analyze_text("text", config)
@@ -0,0 +1,38 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from bulk import Checkpoint  # noqa: E402
+
+
+def test_failed_items_are_retried_after_resume(tmp_path):
+    path = str(tmp_path / "results.jsonl.checkpoint")
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done(0)
+    checkpoint.mark_done(1, failed=True)
+    checkpoint.mark_done(2)
+    checkpoint.save(100)
+
+    resumed = Checkpoint(path)
+    assert resumed.loaded
+    assert [resumed.is_done(position) for position in range(4)] == [
+        True,
+        False,
+        True,
+        False,
+    ]
+
+    resumed.mark_done(1)
+    resumed.save(150)
+    assert Checkpoint(path).is_done(1)
+    assert Checkpoint(path).failed == set()
+
+
+def test_items_failing_again_stay_failed(tmp_path):
+    path = str(tmp_path / "results.jsonl.checkpoint")
+    checkpoint = Checkpoint(path)
+    checkpoint.mark_done(0, failed=True)
+    checkpoint.mark_done(0, failed=True)
+    checkpoint.save(0)
+    assert not Checkpoint(path).is_done(0)
+    assert Checkpoint(path).position == 1
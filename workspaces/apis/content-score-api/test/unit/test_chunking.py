@@ -0,0 +1,79 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+import chunking
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+def config(value):
+    return {
+        "models": [
+            {
+                "name": "bias/openai/gpt-3.5-v2",
+                "config": {"activation": {}, "model": {"chunking": value}},
+            }
+        ]
+    }
+
+
+@pytest.fixture(scope="module")
+def client():
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "yes",
+        5,
+        {"max_tokens": 0},
+        {"reducer": "max"},
+        # a window of one token would make one model call per token
+        {"max_tokens": 10, "overlap": 9},
+        {"max_tokens": 10, "overlap": 10},
+        {"max_tokens": 10, "overlap": 11},
+    ],
+)
+def test_invalid_chunking_config_is_rejected(client, value):
+    response = client.post(
+        "/trustlevels", json={"text": "text", "config": config(value)}
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/trustlevels/batch",
+        json={"items": [{"id": "1", "text": "text", "config": config(value)}]},
+    )
+    assert response.status_code == 422
+
+
+def test_text_with_too_many_chunks_is_rejected(client):
+    words = chunking.CHUNKING_MAX_CHUNKS * 10 + 1
+    text = " ".join(f"w{i}" for i in range(words))
+    value = {"max_tokens": 10}
+    response = client.post("/trustlevels", json={"text": text, "config": config(value)})
+    assert response.status_code == 422
+    assert "at most" in response.json()["detail"][0]["msg"]
+
+
+@pytest.mark.parametrize("overlap", [6, 9, 10, 11])
+def test_overlap_must_be_at_most_half_of_max_tokens(overlap):
+    with pytest.raises(ValueError):
+        chunking.parse_config({"max_tokens": 10, "overlap": overlap})
+
+
+def test_overlap_of_half_of_max_tokens_is_valid():
+    assert chunking.parse_config({"max_tokens": 10, "overlap": 5}).overlap == 5
+
+
+@pytest.mark.parametrize("words", [1, 10, 11, 17, 18, 100, 1000])
+def test_count_chunks_matches_split_text(words):
+    text = " ".join(f"w{i}" for i in range(words))
+    settings = chunking.ChunkingConfig(max_tokens=10, overlap=3)
+    chunks = chunking.split_text(text, settings.max_tokens, settings.overlap)
+    assert chunking.count_chunks(chunking.count_tokens(text), settings) == len(chunks)
@@ -0,0 +1,80 @@
+import json
+import logging
+import queue
+import threading
+
+import pytest
+
+import structured_logging
+
+
+class Lines(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(structured_logging.JSONFormatter("test"))
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(json.loads(self.format(record)))
+
+
+@pytest.fixture
+def handler():
+    target = Lines()
+    handler = structured_logging._BackgroundHandler(target)
+    yield handler
+    handler.listener.stop()
+
+
+def record(msg, *args, exc_info=None):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, exc_info)
+
+
+def test_message_is_rendered_by_the_caller(handler):
+    # stop the listener so the record waits in the queue like under load
+    handler.listener.stop()
+    values = [1, 2]
+    handler.handle(record("values: %s", values))
+    values.append(3)
+    handler.listener.start()
+    handler.flush()
+    assert handler.target.lines[0]["message"] == "values: [1, 2]"
+
+
+def test_exception_is_rendered_by_the_caller(handler):
+    try:
+        raise ValueError("invalid")
+    except ValueError as e:
+        exc_info = (type(e), e, e.__traceback__)
+    handler.handle(record("failed", exc_info=exc_info))
+    handler.flush()
+    line = handler.target.lines[0]
+    assert line["message"] == "failed"
+    assert "ValueError: invalid" in line["exception"]
+
+
+def test_dropped_records_are_counted_across_threads(handler):
+    handler.listener.stop()
+    handler.queue = queue.Queue(1)
+    handler.queue.put_nowait(record("first"))
+
+    def log():
+        for _ in range(1000):
+            handler.handle(record("dropped"))
+
+    threads = [threading.Thread(target=log) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert handler.dropped == 8000
+
+    handler.queue = queue.Queue(10)
+    handler.handle(record("after"))
+    messages = [handler.queue.get_nowait().getMessage() for _ in range(2)]
+    assert messages == [
+        "Dropped 8000 log records, the log queue was full",
+        "after",
+    ]
+    assert handler.dropped == 0
+    handler.listener.start()
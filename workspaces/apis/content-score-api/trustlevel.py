@@ -1,23 +1,28 @@
+import asyncio
+import logging
 import math
 
 from enum import Enum
 from pydantic import BaseModel
-from typing import List, Protocol, Dict, Any
-from typing_extensions import TypedDict
+from typing import List, Optional, Protocol, Dict, Any, Tuple
+from typing_extensions import NotRequired, TypedDict
+
+logger = logging.getLogger(__name__)
 
 
 # should be in main.py because the content qulity score shouldn't know about the models
 # but this way pydantic can validate the model name
 class ModelType(str, Enum):
     polarity_openai_gpt3_5_v1 = "polarity/openai/gpt-3.5-v1"
-    # polarity_spacytextblob = "polarity/spacytextblob"
+    polarity_spacytextblob = "polarity/spacytextblob"
     objectivity_openai_gpt3_5_v1 = "objectivity/openai/gpt-3.5-v1"
-    # objectivity_spacytextblob = "objectivity/spacytextblob"
+    objectivity_spacytextblob = "objectivity/spacytextblob"
     bias_openai_gpt3_5_v0 = "bias/openai/gpt-3.5-v0"
     bias_openai_gpt3_5_v1 = "bias/openai/gpt-3.5-v1"
     bias_openai_gpt3_5_v2 = "bias/openai/gpt-3.5-v2"
     bias_openai_gpt4_v1 = "bias/openai/gpt-4-v1"
-    # bias_d4data = "bias/d4data"
+    bias_d4data = "bias/d4data"
+    bias_cascade = "bias/cascade"
     trustlevel_openai_gpt3_5_v1 = "trustlevel/openai/gpt-3.5-v1"
     trustlevel_openai_gpt3_5_v2 = "trustlevel/openai/gpt-3.5-v2"
 
@@ -32,6 +37,11 @@ class TrustLevelConfig(BaseModel):
     weight: float = 1.0
     model: Dict[str, Any] = None
     activation: TrustLevelActivation
+    # seconds after which the model (including its fallback) is reported as missing
+    timeout: float = None
+    # model used if this one fails, or takes longer than hedge_after seconds
+    fallback: ModelType = None
+    hedge_after: float = None
 
 
 class Model(BaseModel):
@@ -44,9 +54,13 @@ class Config(BaseModel):
 
 
 class ModelScore(TypedDict):
-    raw: float
-    scaled: float
+    raw: Optional[float]
+    scaled: Optional[float]
     details: Any
+    # the model did not finish in time and is left out of the score
+    missing: NotRequired[bool]
+    # the model that answered instead of this one
+    fallback: NotRequired[ModelType]
 
 
 class ContentQuality(BaseModel):
@@ -66,30 +80,184 @@ class TextAnalyzer(Protocol):
         """A TextAnalyzer protocol"""
         ...
 
+    async def analyze_text_async(
+        self, text: str, config: Dict[str, Any]
+    ) -> TextAnalyzerResponse:
+        """Non-blocking variant of analyze_text used by content_quality_score_async"""
+        ...
+
 
 def content_quality_score(
     text: str, config: Config, models: Dict[str, TextAnalyzer]
+) -> ContentQuality:
+    results = []
+    for model in config.models:
+        analyzer = _get_analyzer(models, model)
+        results.append(analyzer.analyze_text(text, model.config.model))
+    return _aggregate(config, results)
+
+
+async def content_quality_score_async(
+    text: str,
+    config: Config,
+    models: Dict[str, TextAnalyzer],
+    limiter: asyncio.Semaphore = None,
+    deadline: float = None,
+) -> ContentQuality:
+    """
+    Same as content_quality_score but runs the configured models concurrently.
+
+    Models that miss their timeout or the deadline are flagged as missing and the
+    score is computed from the remaining models with their weights scaled up to the
+    total weight.
+
+    Args:
+        text (str): The text to score.
+        config (Config): The models to run and how to weight them.
+        models (Dict[str, TextAnalyzer]): The available analyzers by model name.
+        limiter (asyncio.Semaphore): Optional cap on the number of analyzer calls in flight.
+        deadline (float): Optional seconds after which unfinished models are missing.
+
+    Returns:
+        ContentQuality: The aggregated result, identical to content_quality_score if
+        all models finished.
+
+    Raises:
+        asyncio.TimeoutError: If no model finished in time.
+
+    """
+    for model in config.models:
+        _get_analyzer(models, model)
+        if model.config.fallback is not None and model.config.fallback not in models:
+            raise ValueError(f"Unknown model {model.config.fallback}")
+
+    async def analyze(name: ModelType, model_config: Dict[str, Any]):
+        analyzer = models[name]
+        if limiter is None:
+            return await analyze_text_async(analyzer, text, model_config)
+        async with limiter:
+            return await analyze_text_async(analyzer, text, model_config)
+
+    tasks = [
+        asyncio.ensure_future(_analyze_model(analyze, model)) for model in config.models
+    ]
+    try:
+        done, pending = await asyncio.wait(
+            tasks, timeout=deadline, return_when=asyncio.FIRST_EXCEPTION
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+    for task in done:
+        if task.exception() is not None:
+            raise task.exception()
+
+    results, fallbacks = [], []
+    for task, model in zip(tasks, config.models):
+        result, fallback = task.result() if task in done else (None, None)
+        if task in pending:
+            logger.warning("%s missed the deadline of %ss", model.name.value, deadline)
+        results.append(result)
+        fallbacks.append(fallback)
+    if all(result is None for result in results):
+        raise asyncio.TimeoutError("No model finished in time")
+    return _aggregate(config, results, fallbacks)
+
+
+async def _analyze_model(analyze, model: Model) -> Tuple[Any, Optional[ModelType]]:
+    """Run a model with its timeout and fallback, (None, None) if it timed out"""
+    config = model.config
+    try:
+        if config.fallback is None:
+            result = analyze(model.name, config.model)
+            return await asyncio.wait_for(result, config.timeout), None
+        result = _hedge(analyze, model)
+        return await asyncio.wait_for(result, config.timeout)
+    except asyncio.TimeoutError:
+        logger.warning("%s timed out after %ss", model.name.value, config.timeout)
+        return None, None
+
+
+async def _hedge(analyze, model: Model) -> Tuple[Any, Optional[ModelType]]:
+    """Start the fallback if the model fails or after hedge_after, the first answer wins"""
+    config = model.config
+    primary = asyncio.ensure_future(analyze(model.name, config.model))
+    fallback = None
+    tasks = {primary}
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                tasks,
+                timeout=config.hedge_after if fallback is None else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                tasks.discard(task)
+                if task.exception() is None:
+                    return task.result(), None if task is primary else config.fallback
+                logger.warning("%s failed", model.name.value, exc_info=task.exception())
+                if not tasks and fallback is not None:
+                    raise task.exception()
+            if fallback is None:
+                # the model config belongs to the primary, the fallback uses defaults
+                fallback = asyncio.ensure_future(analyze(config.fallback, None))
+                tasks.add(fallback)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _get_analyzer(models: Dict[str, TextAnalyzer], model: Model) -> TextAnalyzer:
+    if model.name not in models:
+        raise ValueError(f"Unknown model {model.name}")
+    return models[model.name]
+
+
+async def analyze_text_async(
+    analyzer: TextAnalyzer, text: str, config: Dict[str, Any]
+) -> TextAnalyzerResponse:
+    """Call the analyzer without blocking the event loop"""
+    if hasattr(analyzer, "analyze_text_async"):
+        return await analyzer.analyze_text_async(text, config)
+    # analyzers without async support must not block the event loop
+    return await asyncio.to_thread(analyzer.analyze_text, text, config)
+
+
+def _aggregate(
+    config: Config,
+    results: List[Any],
+    fallbacks: List[Optional[ModelType]] = None,
 ) -> ContentQuality:
     score = 0.0
     scores = {}
     explanations = []
-    for model in config.models:
-        if model.name in models:
-            result = models[model.name].analyze_text(text, model.config.model)
-
-            result = TextAnalyzerResponse.model_validate(result)
-            model_score = result.score
-            scaled_score = sigmoid(model_score, model.config.activation)
+    total_weight = finished_weight = 0.0
+    for model, result, fallback in zip(
+        config.models, results, fallbacks or [None] * len(results)
+    ):
+        total_weight += model.config.weight
+        if result is None:
             scores[model.name] = ModelScore(
-                raw=model_score,
-                scaled=scaled_score,
-                details=result.details,
+                raw=None, scaled=None, details=None, missing=True
             )
-            if result.explanations:
-                explanations.extend(result.explanations)
-            score += model.config.weight * scaled_score
-        else:
-            raise ValueError(f"Unknown model {model.name}")
+            continue
+        result = TextAnalyzerResponse.model_validate(result)
+        model_score = result.score
+        scaled_score = sigmoid(model_score, model.config.activation)
+        scores[model.name] = ModelScore(
+            raw=model_score,
+            scaled=scaled_score,
+            details=result.details,
+        )
+        if fallback is not None:
+            scores[model.name]["fallback"] = fallback
+        if result.explanations:
+            explanations.extend(result.explanations)
+        score += model.config.weight * scaled_score
+        finished_weight += model.config.weight
+    # renormalize the weights over the finished models
+    if finished_weight and finished_weight != total_weight:
+        score *= total_weight / finished_weight
     return ContentQuality(score=score, scores=scores, explanations=explanations)
 
 
@@ -1,4 +1,4 @@
-import {App, Stack} from 'aws-cdk-lib';
+import {App, Duration, Stack} from 'aws-cdk-lib';
 import {Repository} from 'aws-cdk-lib/aws-ecr';
 import {
   Cluster,
@@ -90,6 +90,18 @@ export class BiasDetectStack extends Stack {
           logGroup: logGroup,
           streamPrefix: 'ecs',
         }),
+        // /ready answers 200 once a gunicorn worker has run its warm-up inference. It
+        // only reports the worker that answers, other workers may still be warming up.
+        healthCheck: {
+          command: [
+            'CMD-SHELL',
+            'python -c "import urllib.request; urllib.request.urlopen(\'http://localhost:5000/ready\')" || exit 1',
+          ],
+          interval: Duration.seconds(30),
+          timeout: Duration.seconds(5),
+          retries: 3,
+          startPeriod: Duration.seconds(120),
+        },
       }
     );
 
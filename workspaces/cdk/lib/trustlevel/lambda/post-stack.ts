@@ -54,6 +54,9 @@ export class TrustlevelPostStack extends cdk.Stack {
         // NOTE: replace with more secure method:
         // https://docs.aws.amazon.com/systems-manager/latest/userguide/ps-integration-lambda-extensions.html#arm64
         OPENAI_API_KEY: openaiApiKey.unsafeUnwrap(),
+        // self-hosted models, see the cloud map names in biasdetect-stack.ts and spacytextblob-stack.ts
+        BIASD4DATA_URL: `http://biasDetect-service-${stage}.biasDetect-${stage}.local:5000`,
+        SPACYTEXTBLOB_URL: `http://spacytextblob-service-${stage}.spacytextblob-${stage}.local:5000`,
       },
     })
 